@@ -0,0 +1,42 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Throughput and memory usage of a full sqlite search index build on a synthetic corpus
+
+	bench --site <site> execute wiki.benchmarks.build_index.run --kwargs "{'pages': 100000}"
+
+Pages are generated as the build consumes them, like they are streamed from
+the database, so the corpus is never in memory as a whole.
+"""
+
+import os
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from wiki.benchmarks.corpus import CorpusGenerator
+from wiki.wiki.doctype.wiki_page import sqlite_search
+
+
+def run(pages: int = 100000, workers: int = sqlite_search.INDEX_BUILD_WORKERS):
+	with tempfile.TemporaryDirectory() as tmp:
+		index_path = Path(tmp) / "build_benchmark.db"
+
+		start = time.perf_counter()
+		count = sqlite_search._write_index(index_path, CorpusGenerator().pages(pages), workers=workers)
+		seconds = time.perf_counter() - start
+
+		report = {
+			"pages": count,
+			"workers": workers,
+			"seconds": round(seconds, 2),
+			"pages_per_second": round(count / seconds, 1),
+			"index_size_mb": round(os.path.getsize(index_path) / 1024 / 1024, 1),
+			"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+			"workers_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+		}
+
+	print(report)
+	return report
@@ -0,0 +1,101 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""Synthetic wiki pages with realistic markdown, for search benchmarks"""
+
+import datetime
+import itertools
+import random
+
+import frappe
+
+COMMON_WORDS = (
+	"the a to of and in is for on with that this by be as it can you your are from or an use when "
+	"which will all if not each then new set more these only one must see also should other".split()
+)
+
+DOC_WORDS = (
+	"install installation setup configure configuration permission permissions role roles user users "
+	"api endpoint request response server client database query index search report print format "
+	"invoice customer supplier item stock warehouse account payment ledger journal entry tax "
+	"workflow email notification template webhook integration backup restore migrate upgrade "
+	"deploy production development environment variable command terminal bench site app module "
+	"doctype field form list view filter sort export import data file upload attachment error "
+	"debug log cache redis worker queue job scheduler cron session login password token oauth"
+).split()
+
+SYLLABLES = "ka lo mi ne su ta ri po ve da ge hu ji ko la ma no pe qu ra si to vu wa xe yo ze".split()
+
+
+class CorpusGenerator:
+	"""
+	Generates Wiki Page like dicts with markdown content. Word frequencies
+	follow a rough zipf distribution over common, documentation and rare
+	made up words, so index and query behaviour resembles a real wiki.
+	"""
+
+	def __init__(self, seed: int = 42, spaces: int = 10, rare_words: int = 20000):
+		self.random = random.Random(seed)
+		self.spaces = [f"space-{i}" for i in range(spaces)]
+		self.rare_words = sorted(
+			{
+				"".join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 4)))
+				for _ in range(rare_words)
+			}
+		)
+		self.words = COMMON_WORDS + DOC_WORDS + self.rare_words
+		self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+
+	def pages(self, count: int):
+		modified = datetime.datetime(2025, 1, 1)
+		for i in range(count):
+			space = self.spaces[i % len(self.spaces)]
+			title = self.sentence(2, 6).title()
+			yield frappe._dict(
+				name=f"bench-{i:07d}",
+				title=title,
+				content=self.markdown(),
+				route=f"{space}/{i}-{title.lower().replace(' ', '-')}",
+				space=space,
+				modified=modified.isoformat(),
+				published=1,
+				allow_guest=int(i % 5 != 0),
+			)
+
+	def sentence(self, min_words: int = 6, max_words: int = 18) -> str:
+		count = self.random.randint(min_words, max_words)
+		return " ".join(self.random.choices(self.words, cum_weights=self.cum_weights, k=count))
+
+	def markdown(self, sections: int | None = None) -> str:
+		blocks = []
+		for _ in range(sections or self.random.randint(1, 6)):
+			blocks.append(f"{'#' * self.random.randint(2, 3)} {self.sentence(2, 5).title()}")
+			for _ in range(self.random.randint(1, 4)):
+				kind = self.random.random()
+				if kind < 0.6:
+					blocks.append(
+						" ".join(self.sentence().capitalize() + "." for _ in range(self.random.randint(1, 5)))
+					)
+				elif kind < 0.75:
+					blocks.append(
+						"\n".join(f"- {self.sentence(3, 8)}" for _ in range(self.random.randint(2, 5)))
+					)
+				elif kind < 0.85:
+					blocks.append(f"```\n$ bench {self.sentence(1, 3)}\n```")
+				elif kind < 0.95:
+					blocks.append(
+						f"See [{self.sentence(1, 3)}](/docs/{self.random.choice(DOC_WORDS)}) for **details**."
+					)
+				else:
+					blocks.append(f"> {self.sentence()}")
+		return "\n\n".join(blocks)
+
+	def misspell(self, word: str) -> str:
+		"""Drop, double or swap a letter of the word"""
+		i = self.random.randint(1, len(word) - 2)
+		kind = self.random.randint(0, 2)
+		if kind == 0:
+			return word[:i] + word[i + 1 :]
+		if kind == 1:
+			return word[:i] + word[i] + word[i:]
+		return word[: i - 1] + word[i] + word[i - 1] + word[i + 1 :]
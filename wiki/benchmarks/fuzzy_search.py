@@ -0,0 +1,74 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Latency of the typo tolerant fallback of the sqlite search on a synthetic corpus
+
+	bench --site <site> execute wiki.benchmarks.fuzzy_search.run --kwargs "{'pages': 50000}"
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from wiki.benchmarks.corpus import DOC_WORDS, CorpusGenerator
+from wiki.benchmarks.stats import get_percentiles
+from wiki.wiki.doctype.wiki_page import sqlite_search
+
+# budget for the time the fallback adds on top of the search for the corrected query
+LATENCY_BUDGET_MS = 20
+# budget for the whole search of a misspelled query, the search for the correction included
+TOTAL_LATENCY_BUDGET_MS = 100
+
+
+def run(
+	pages: int = 50000,
+	queries: int = 200,
+	budget_ms: float = LATENCY_BUDGET_MS,
+	total_budget_ms: float = TOTAL_LATENCY_BUDGET_MS,
+):
+	corpus = CorpusGenerator()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		index_path = Path(tmp) / "fuzzy_benchmark.db"
+
+		start = time.perf_counter()
+		sqlite_search._write_index(index_path, corpus.pages(pages))
+		print(f"Indexed {pages} pages in {time.perf_counter() - start:.1f}s")
+
+		words = [w for w in DOC_WORDS + corpus.rare_words[:500] if len(w) >= 5]
+		typos = [corpus.misspell(corpus.random.choice(words)) for _ in range(queries)]
+
+		pool = sqlite_search._ReaderPool(index_path)
+		fallback_timings, total_timings = [], []
+		corrected = 0
+		with pool.connection() as conn:
+			cursor = conn.cursor()
+			for query in typos:
+				# cost added by the fallback: the missed search and finding a correction
+				start = time.perf_counter()
+				sqlite_search._run_search_query(cursor, query, fuzzy=False)
+				sqlite_search._correct_query(cursor, query)
+				fallback_timings.append((time.perf_counter() - start) * 1000)
+
+				start = time.perf_counter()
+				result = sqlite_search._run_search_query(cursor, query)
+				total_timings.append((time.perf_counter() - start) * 1000)
+				corrected += "corrected_query" in result
+		pool.reset()
+
+	report = {
+		"pages": pages,
+		"queries": queries,
+		"corrected": corrected,
+		"fallback_ms": get_percentiles(fallback_timings),
+		# includes the search for the corrected query, which costs as much as any other search
+		"total_ms": get_percentiles(total_timings),
+		"budget_ms": budget_ms,
+		"total_budget_ms": total_budget_ms,
+	}
+	report["within_budget"] = (
+		report["fallback_ms"]["p95"] <= budget_ms and report["total_ms"]["p95"] <= total_budget_ms
+	)
+	print(report)
+	return report
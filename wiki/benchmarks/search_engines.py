@@ -0,0 +1,222 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Compare the search engines of the wiki on synthetic corpora
+
+	bench --site <test site> execute wiki.benchmarks.search_engines.run --kwargs "{'sizes': [1000, 10000, 100000]}"
+
+For every corpus size each engine is loaded with the same pages and the same
+query mix (prefix, phrase, boolean and scoped to a space) is replayed through
+search.search, once sequentially for latency and once from concurrent
+threads for throughput. Results are never served from the result cache, every
+query is unique and the index generation is bumped between the two runs.
+
+The benchmark replaces the sqlite and RediSearch indexes and adds rows to the
+global search table of the site, so it only runs on sites with allow_tests.
+The indexes are rebuilt from the site's pages once it's done. RediSearch is
+skipped if it's not available, a local redis-stack container is enough.
+"""
+
+import json
+import os
+import threading
+import time
+
+import frappe
+from redis.exceptions import ResponseError
+
+from wiki.benchmarks.corpus import DOC_WORDS, CorpusGenerator
+from wiki.benchmarks.stats import get_percentiles
+from wiki.wiki.doctype.wiki_page import search, sqlite_search
+from wiki.wiki_search import WikiSearch
+
+ENGINES = ("sqlite_fts", "redisearch", "frappe_web_search")
+ENGINE_SETTINGS = {
+	"sqlite_fts": {"use_sqlite_for_search": 1, "use_redisearch_for_search": 0},
+	"redisearch": {"use_sqlite_for_search": 0, "use_redisearch_for_search": 1},
+	"frappe_web_search": {"use_sqlite_for_search": 0, "use_redisearch_for_search": 0},
+}
+QUERIES_PER_KIND = 50
+CONCURRENCY = 8
+WEB_SEARCH_BATCH_SIZE = 500
+
+
+def run(
+	sizes: list[int] | None = None,
+	engines: list[str] | None = None,
+	concurrency: int = CONCURRENCY,
+	output: str | None = None,
+):
+	if not frappe.conf.allow_tests:
+		frappe.throw("The search benchmark replaces the search indexes, run it on a test site")
+
+	settings = frappe.get_single("Wiki Settings")
+	original_settings = {field: settings.get(field) for field in ENGINE_SETTINGS["sqlite_fts"]}
+
+	report = []
+	try:
+		for size in sizes or [1000, 10000, 100000]:
+			queries = get_query_mix(CorpusGenerator())
+			for engine in engines or ENGINES:
+				print(f"Benchmarking {engine} with {size} pages")
+				report.append(
+					{"engine": engine, "pages": size, **_benchmark(engine, size, queries, concurrency)}
+				)
+				print(json.dumps(report[-1]))
+	finally:
+		_delete_web_search_pages()
+		_set_engine_settings(original_settings)
+		search.build_index_in_background()
+
+	if output:
+		with open(output, "w") as f:
+			json.dump(report, f, indent=1)
+
+	return report
+
+
+def get_query_mix(corpus: CorpusGenerator) -> list[dict]:
+	"""Unique queries of each kind, using words that are frequent enough to have matches"""
+	rng = corpus.random
+	words = [w for w in DOC_WORDS if len(w) > 4]
+	kinds = {
+		"prefix": lambda: rng.choice(words)[: rng.randint(3, 5)] + "*",
+		"phrase": lambda: '"{} {}"'.format(*rng.sample(words, 2)),
+		"boolean": lambda: f"{rng.choice(words)} {rng.choice(['AND', 'OR', 'NOT'])} {rng.choice(words)}",
+		"scoped": lambda: rng.choice(words),
+	}
+
+	queries = []
+	for kind, make_query in kinds.items():
+		seen = set()
+		while len(seen) < QUERIES_PER_KIND:
+			query = make_query()
+			space = rng.choice(corpus.spaces) if kind == "scoped" else None
+			if (query, space) not in seen:
+				seen.add((query, space))
+				queries.append({"kind": kind, "query": query, "space": space})
+
+	rng.shuffle(queries)
+	return queries
+
+
+def _benchmark(engine: str, size: int, queries: list[dict], concurrency: int) -> dict:
+	_set_engine_settings(ENGINE_SETTINGS[engine])
+	if search.get_search_engine() != engine:
+		return {"skipped": f"{engine} is not available"}
+
+	start = time.perf_counter()
+	try:
+		index_size = _load_corpus(engine, CorpusGenerator().pages(size))
+	except ResponseError as e:
+		# redis without the search module
+		return {"skipped": str(e)}
+	build_seconds = time.perf_counter() - start
+
+	search.bump_index_generation()
+	timings = {kind: [] for kind in {q["kind"] for q in queries}}
+	for q in queries:
+		start = time.perf_counter()
+		search.search(q["query"], space=q["space"])
+		timings[q["kind"]].append((time.perf_counter() - start) * 1000)
+
+	search.bump_index_generation()
+	throughput = _run_concurrently(queries, concurrency)
+
+	return {
+		"build_seconds": round(build_seconds, 2),
+		"index_size_mb": round(index_size / 1024 / 1024, 1) if index_size is not None else None,
+		"latency_ms": get_percentiles([t for kind in timings.values() for t in kind]),
+		"latency_ms_by_kind": {kind: get_percentiles(t) for kind, t in timings.items()},
+		"queries_per_second": throughput,
+		"concurrency": concurrency,
+	}
+
+
+def _load_corpus(engine: str, pages) -> int | None:
+	"""Index the pages with the engine, returns the size of the index in bytes"""
+	if engine == "sqlite_fts":
+		sqlite_search._replace_index(pages)
+		return os.path.getsize(sqlite_search._get_index_path())
+
+	if engine == "redisearch":
+		wiki_search = WikiSearch.get_instance()
+		wiki_search.rebuild_index(wiki_search.get_document(page) for page in pages)
+		info = wiki_search.redis.ft(wiki_search.index_name).info()
+		size_mb = sum(float(v) for k, v in info.items() if k.endswith(("_sz_mb", "_size_mb")))
+		return int(size_mb * 1024 * 1024)
+
+	_delete_web_search_pages()
+	batch = []
+	for page in pages:
+		batch.append(page)
+		if len(batch) == WEB_SEARCH_BATCH_SIZE:
+			_insert_web_search_pages(batch)
+			batch = []
+	_insert_web_search_pages(batch)
+	frappe.db.commit()
+
+	return frappe.db.sql(
+		"""
+		SELECT data_length + index_length FROM information_schema.tables
+		WHERE table_schema = database() AND table_name = '__global_search'
+	"""
+	)[0][0]
+
+
+def _insert_web_search_pages(pages):
+	if not pages:
+		return
+
+	values = []
+	for page in pages:
+		values += ["Wiki Page", page.name, page.title, page.content, page.route, 1]
+
+	frappe.db.sql(
+		"""
+		INSERT INTO `__global_search` (doctype, name, title, content, route, published)
+		VALUES {}
+	""".format(", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(pages))),
+		values,
+	)
+
+
+def _delete_web_search_pages():
+	frappe.db.sql("DELETE FROM `__global_search` WHERE doctype = 'Wiki Page' AND name LIKE 'bench-%%'")
+	frappe.db.commit()
+
+
+def _run_concurrently(queries: list[dict], concurrency: int) -> float:
+	"""Queries per second with the queries spread over threads, each with its own site connection"""
+	site, sites_path = frappe.local.site, frappe.local.sites_path
+	errors = []
+
+	def worker(chunk):
+		frappe.init(site=site, sites_path=sites_path)
+		frappe.connect()
+		try:
+			for q in chunk:
+				search.search(q["query"], space=q["space"])
+		except Exception as e:
+			errors.append(e)
+		finally:
+			frappe.destroy()
+
+	threads = [threading.Thread(target=worker, args=(queries[i::concurrency],)) for i in range(concurrency)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	seconds = time.perf_counter() - start
+
+	if errors:
+		raise errors[0]
+	return round(len(queries) / seconds, 1)
+
+
+def _set_engine_settings(values: dict):
+	for field, value in values.items():
+		frappe.db.set_single_value("Wiki Settings", field, value)
+	frappe.db.commit()
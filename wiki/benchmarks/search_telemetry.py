@@ -0,0 +1,51 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Overhead of search telemetry per query, tracing the stages of a sqlite search and recording it
+with the sampling of the site
+
+	bench --site <site> execute wiki.benchmarks.search_telemetry.run
+
+Nothing is flushed to redis, the flush runs once every FLUSH_INTERVAL seconds
+and is not part of the per query cost.
+"""
+
+import time
+
+from wiki.benchmarks.corpus import DOC_WORDS
+from wiki.wiki.doctype.wiki_page.search_telemetry import (
+	SearchTelemetry,
+	end_trace,
+	get_trace,
+	start_trace,
+)
+
+OVERHEAD_BUDGET_US = 5
+
+
+def run(queries: int = 100000):
+	telemetry = SearchTelemetry()
+	telemetry._last_flush = float("inf")
+	words = [w for w in DOC_WORDS if len(w) > 4]
+
+	start = time.perf_counter()
+	for i in range(queries):
+		trace = start_trace()
+		# search.search marks the cache lookup, the engine the rest of the stages
+		get_trace().mark("cache")
+		engine_trace = get_trace()
+		for stage in ("clean", "match", "rerank", "highlight"):
+			engine_trace.mark(stage)
+		if trace:
+			telemetry.record("sqlite_fts", words[i % len(words)], trace, i % 10)
+		end_trace()
+	overhead_us = (time.perf_counter() - start) / queries * 1_000_000
+
+	report = {
+		"queries": queries,
+		"overhead_us": round(overhead_us, 2),
+		"within_budget": overhead_us <= OVERHEAD_BUDGET_US,
+	}
+	print(report)
+	return report
@@ -0,0 +1,15 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import statistics
+
+
+def get_percentiles(timings: list[float]) -> dict[str, float]:
+	"""p50, p95, p99 and max of the timings, rounded to two decimals"""
+	timings = sorted(timings)
+	return {
+		"p50": round(statistics.median(timings), 2),
+		"p95": round(timings[max(int(len(timings) * 0.95) - 1, 0)], 2),
+		"p99": round(timings[max(int(len(timings) * 0.99) - 1, 0)], 2),
+		"max": round(timings[-1], 2),
+	}
@@ -0,0 +1,77 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Time to add heading ids and build the TOC of a rendered page, the single pass
+of WikiPage.compile_html against the BeautifulSoup implementation it replaced
+
+	bench --site <site> execute wiki.benchmarks.toc.run --kwargs "{'headings': 1000}"
+"""
+
+import random
+import statistics
+import time
+
+import frappe
+from bs4 import BeautifulSoup
+
+from wiki.benchmarks.corpus import DOC_WORDS
+from wiki.render_cache import render_markdown
+from wiki.utils import get_heading_id
+from wiki.wiki.doctype.wiki_page.wiki_page import WikiPage
+
+
+def compile_html_soup(title, html):
+	"""WikiPage.compile_html as it was, before headings got unique ids"""
+	soup = BeautifulSoup(html, "html.parser")
+	toc_html = f"<li><a  style='padding-left: 1rem' href='#{get_heading_id(title)}'>{title}</a></li>"
+	for heading in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]):
+		heading_title = heading.get_text().strip()
+		heading["id"] = get_heading_id(heading_title)
+		level = int(heading.name[1]) + 1
+		toc_html += (
+			f"<li><a style='padding-left: {level - 1}rem' href='#{heading['id']}'>{heading_title}</a></li>"
+		)
+	return str(soup), toc_html, len(soup.get_text().split())
+
+
+def get_markdown(headings: int, seed: int = 42) -> str:
+	"""A long page with nested headings, a share of which repeat, each followed by a few paragraphs"""
+	rng = random.Random(seed)
+	lines = []
+	for i in range(headings):
+		level = rng.choice((2, 2, 3, 3, 3, 4))
+		words = rng.sample(DOC_WORDS, 3) if i % 5 else ["Example"]
+		lines.append(f"{'#' * level} {' '.join(words).title()} `{rng.choice(DOC_WORDS)}`\n")
+		for _ in range(rng.randint(1, 3)):
+			lines.append(" ".join(rng.choices(DOC_WORDS, k=rng.randint(20, 60))) + "\n")
+	return "\n".join(lines)
+
+
+def run(headings: int = 500, repeat: int = 20):
+	html = render_markdown(get_markdown(headings))
+	page = frappe._dict(title="Benchmark")
+
+	timings = {}
+	for name, compile_html in (
+		("beautifulsoup", lambda: compile_html_soup(page.title, html)),
+		("single_pass", lambda: WikiPage.compile_html(page, html)),
+	):
+		samples = []
+		for _ in range(repeat):
+			start = time.perf_counter()
+			compile_html()
+			samples.append((time.perf_counter() - start) * 1000)
+		timings[name] = round(statistics.median(samples), 2)
+
+	anchors = WikiPage.compile_html(page, html)[1].count("href=")
+	report = {
+		"headings": headings,
+		"html_kb": len(html) // 1024,
+		"toc_entries": anchors,
+		"beautifulsoup_ms": timings["beautifulsoup"],
+		"single_pass_ms": timings["single_pass"],
+		"speedup": round(timings["beautifulsoup"] / timings["single_pass"], 1),
+	}
+	print(report)
+	return report
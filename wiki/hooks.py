@@ -75,7 +75,11 @@ website_route_rules = [
 # before_install = "wiki.install.before_install"
 after_install = "wiki.install.after_install"
 
-after_migrate = ["wiki.wiki.doctype.wiki_page.search.build_index_in_background"]
+after_migrate = [
+	"wiki.wiki.doctype.wiki_page.search.build_index_in_background",
+	"wiki.wiki.doctype.wiki_space.space_routes.clear_space_routes",
+	"wiki.wiki.doctype.wiki_page.page_routes.clear_page_routes",
+]
 
 # Desk Notifications
 # ------------------
@@ -120,8 +124,9 @@ after_migrate = ["wiki.wiki.doctype.wiki_page.search.build_index_in_background"]
 
 scheduler_events = {
 	"cron": {
-		"*/15 * * * *": ["wiki.wiki.doctype.wiki_page.search.build_index_in_background"],
+		"*/15 * * * *": ["wiki.wiki.doctype.wiki_page.search.schedule_pending_index_updates"],
 	},
+	"hourly_long": ["wiki.wiki.doctype.wiki_page.search.reconcile_index"],
 }
 
 # scheduler_events = {
@@ -374,38 +374,48 @@ window.RenderWiki = class RenderWiki extends Wiki {
   }
 
   set_revisions() {
-    const initial_content = $(".revision-content").html().trim();
+    const wiki_page_name = $('[name="wiki-page-name"]').val();
+    const revision_methods =
+      "wiki.wiki.doctype.wiki_page_revision.wiki_page_revision";
+    // metadata of the revisions loaded so far, newest first,
+    // their content is fetched once a revision is shown
     let revisions = [];
-    let currentRevisionIndex = 1;
-
-    // set initial revision
-    if (initial_content !== "<h3>No Revisions</h3>") {
-      $(".revision-content")[0].innerHTML = HtmlDiff.execute(
-        $(".revision-content").html(),
-        $(".from-markdown .wiki-content")
-          .html()
-          .replaceAll(/<br class="ProseMirror-trailingBreak">/g, ""),
-      );
-      $(".previous-revision").removeClass("hide");
-    } else {
-      $(".revision-content")[0].innerHTML =
-        `<div class="no-revision">No Revisions</div>`;
-      $(".revision-time").hide();
-      $(".revisions-modal .modal-header").hide();
+    let nextCursor = null;
+    let loaded = false;
+    const contents = {};
+    let currentRevisionIndex = 0;
+
+    function call(method, args) {
+      return new Promise((resolve) => {
+        frappe.call({
+          method: `${revision_methods}.${method}`,
+          args: args,
+          callback: (r) => resolve(r.message),
+        });
+      });
     }
 
-    $(".show-revisions").on("click", function () {
-      frappe.call({
-        method:
-          "wiki.wiki.doctype.wiki_page_revision.wiki_page_revision.get_revisions",
-        args: {
-          wiki_page_name: $('[name="wiki-page-name"]').val(),
-        },
-        callback: (r) => {
-          revisions = r.message;
-        },
+    async function loadRevisions() {
+      const page = await call("get_revisions", {
+        wiki_page_name: wiki_page_name,
+        cursor: nextCursor,
       });
-    });
+      revisions = revisions.concat(page.revisions);
+      nextCursor = page.next_cursor;
+      loaded = true;
+    }
+
+    async function loadContents(names) {
+      names = names.filter((name) => name && !(name in contents));
+      if (!names.length) return;
+      Object.assign(
+        contents,
+        await call("get_revision_contents", {
+          wiki_page_name: wiki_page_name,
+          revisions: names,
+        }),
+      );
+    }
 
     function addHljsClass() {
       // to fix code blocks not having .hljs class
@@ -415,46 +425,56 @@ window.RenderWiki = class RenderWiki extends Wiki {
       });
     }
 
-    // set previous revision
-    $(".previous-revision").on("click", function () {
-      const currentRevision = revisions[currentRevisionIndex];
-      let previousRevision = { content: "", creation: "", author: "" };
-
-      if (revisions.length > currentRevisionIndex + 1)
-        previousRevision = revisions[currentRevisionIndex + 1];
-
-      if (!previousRevision.content) $(this).addClass("hide");
-      $(".next-revision").removeClass("hide");
-      if (previousRevision.content)
-        $(".revision-content")[0].innerHTML = HtmlDiff.execute(
-          previousRevision.content,
-          currentRevision.content,
-        );
-      else $(".revision-content")[0].innerHTML = currentRevision.content;
+    // show the changes of a revision against the one before it,
+    // the newest revision is compared with the content of the page
+    async function showRevision(index) {
+      if (index + 2 > revisions.length && nextCursor) await loadRevisions();
+
+      const currentRevision = revisions[index];
+      const previousRevision = revisions[index + 1];
+      if (!currentRevision || (index == 0 && !previousRevision)) {
+        $(".revision-content")[0].innerHTML =
+          `<div class="no-revision">No Revisions</div>`;
+        $(".revision-time").hide();
+        $(".revisions-modal .modal-header").hide();
+        return;
+      }
+
+      await loadContents([
+        index > 0 && currentRevision.name,
+        previousRevision && previousRevision.name,
+      ]);
+      const currentContent =
+        index == 0
+          ? $(".from-markdown .wiki-content")
+              .html()
+              .replaceAll(/<br class="ProseMirror-trailingBreak">/g, "")
+          : contents[currentRevision.name];
+
+      $(".revision-content")[0].innerHTML = previousRevision
+        ? HtmlDiff.execute(contents[previousRevision.name], currentContent)
+        : currentContent;
       $(".revision-time")[0].innerHTML =
         `${currentRevision.author} edited ${currentRevision.revision_time}`;
-      currentRevisionIndex++;
+      $(".previous-revision").toggleClass("hide", !previousRevision);
+      $(".next-revision").toggleClass("hide", index == 0);
+      currentRevisionIndex = index;
       addHljsClass();
+    }
+
+    $(".show-revisions").on("click", async function () {
+      if (!loaded) await loadRevisions();
+      showRevision(0);
+    });
+
+    // set previous revision
+    $(".previous-revision").on("click", function () {
+      showRevision(currentRevisionIndex + 1);
     });
 
     // set next revision
     $(".next-revision").on("click", function () {
-      const currentRevision = revisions[currentRevisionIndex - 2];
-      let nextRevision = { content: "", creation: "", author: "" };
-
-      if (currentRevisionIndex > 0)
-        nextRevision = revisions[currentRevisionIndex - 1];
-
-      if (currentRevisionIndex <= 2) $(this).addClass("hide");
-      $(".previous-revision").removeClass("hide");
-      $(".revision-content")[0].innerHTML = HtmlDiff.execute(
-        nextRevision.content,
-        currentRevision.content,
-      );
-      $(".revision-time")[0].innerHTML =
-        `${currentRevision.author} edited ${currentRevision.revision_time}`;
-      currentRevisionIndex--;
-      addHljsClass();
+      showRevision(currentRevisionIndex - 1);
     });
   }
 
@@ -519,35 +539,12 @@ window.RenderWiki = class RenderWiki extends Wiki {
     });
   }
 
-  setup_search(search_scope = "") {
+  setup_search(search_scope = "", suggestions = false) {
     const $dropdown_menu = $("#searchModal .search-dropdown-menu");
     const searchInput = $("#searchInput");
     let dropdownItems;
     let offsetIndex = 0;
 
-    function trimContent(content) {
-      let trimmedLength = 100;
-      const indexOf = content.indexOf('<b class="match">');
-      if (indexOf === -1) {
-        return content.slice(0, 100);
-      }
-
-      let start = indexOf - trimmedLength / 2;
-      if (start < 0) {
-        start = 0;
-      }
-      let end = indexOf + trimmedLength / 2;
-      if (end > content.length) {
-        end = content.length;
-      }
-
-      // fixes html tags when they are sliced
-      return new DOMParser().parseFromString(
-        content.slice(start, end),
-        "text/html",
-      ).body.innerHTML;
-    }
-
     $(document).on("keypress", (e) => {
       if (
         $(e.target).is("textarea, input, select") ||
@@ -565,6 +562,97 @@ window.RenderWiki = class RenderWiki extends Wiki {
       searchInput.trigger("focus");
     });
 
+    // suggestions are cheap and shown while typing, with them the full
+    // search only runs once typing pauses or on enter
+    let results_query = null;
+
+    const run_search = () => {
+      const query = searchInput.val();
+      if (!query || query.length < 2) return;
+
+      frappe
+        .call({
+          method: "wiki.wiki.doctype.wiki_page.search.search",
+          args: {
+            query: query,
+            path: window.location.pathname,
+            space: search_scope,
+          },
+        })
+        .then((res) => {
+          if (searchInput.val() !== query) return;
+
+          let results = res.message.docs || [];
+          let dropdown_html = `<div style="margin: 0.8rem;text-align: center;">No results found</div>`;
+          if (results.length > 0) {
+            dropdown_html = results
+              .map((r) => {
+                let content = r.content;
+                if (content.startsWith("...")) content = content.slice(3);
+
+                return `<a class="dropdown-item" href="/${r.route}">
+              <span class="result-title">${r.title}</span>
+              <div class="result-text">${content}</div>
+              </a>
+              <div class='dropdown-border'></div>`;
+              })
+              .join("");
+            if (res.message.corrected_query)
+              dropdown_html =
+                `<div class="dropdown-item-text text-muted">${__(
+                  "Showing results for {0}",
+                  [`<b>${$("<span>").text(res.message.corrected_query).html()}</b>`],
+                )}</div>` + dropdown_html;
+          }
+
+          results_query = query;
+          show_dropdown(dropdown_html);
+        });
+    };
+
+    const show_suggestions = () => {
+      const query = searchInput.val();
+
+      frappe
+        .call({
+          method: "wiki.wiki.doctype.wiki_page.search.suggest",
+          args: {
+            query: query,
+            path: window.location.pathname,
+            space: search_scope,
+          },
+        })
+        .then((res) => {
+          const { terms = [], pages = [] } = res.message || {};
+          if (searchInput.val() !== query || results_query === query) return;
+          if (!terms.length && !pages.length) return;
+
+          const escape = (text) => $("<span>").text(text).html();
+          show_dropdown(
+            terms
+              .map(
+                (term) =>
+                  `<a class="dropdown-item search-suggestion" href="#" data-query="${escape(term)}">
+              <span class="result-title">${escape(term)}</span>
+              </a>`,
+              )
+              .concat(
+                pages.map(
+                  (page) => `<a class="dropdown-item" href="/${page.route}">
+              <span class="result-title">${escape(page.title)}</span>
+              </a>`,
+                ),
+              )
+              .join("<div class='dropdown-border'></div>"),
+          );
+        });
+    };
+
+    const search_on_pause = frappe.utils.debounce(
+      run_search,
+      suggestions ? 400 : 50,
+    );
+
     searchInput.on(
       "input",
       frappe.utils.debounce(() => {
@@ -573,48 +661,33 @@ window.RenderWiki = class RenderWiki extends Wiki {
           return;
         }
 
-        frappe
-          .call({
-            method: "wiki.wiki.doctype.wiki_page.search.search",
-            args: {
-              query: searchInput.val(),
-              path: window.location.pathname,
-              space: search_scope,
-            },
-          })
-          .then((res) => {
-            let results = res.message.docs || [];
-            let dropdown_html = `<div style="margin: 0.8rem;text-align: center;">No results found</div>`;
-            if (results.length > 0) {
-              dropdown_html = results
-                .map((r) => {
-                  let content = r.content;
-                  if (content.startsWith("...")) content = content.slice(3);
-                  if (res.message.search_engine === "redisearch")
-                    content = trimContent(content);
-
-                  return `<a class="dropdown-item" href="/${r.route}">
-              <span class="result-title">${r.title}</span>
-              <div class="result-text">${content}</div>
-              </a>
-              <div class='dropdown-border'></div>`;
-                })
-                .join("");
-            }
-
-            $dropdown_menu.html(dropdown_html);
-            $dropdown_menu.addClass("show");
-            dropdownItems = $dropdown_menu.find(".dropdown-item");
-          });
-      }, 100),
+        if (suggestions) show_suggestions();
+        search_on_pause();
+      }, 50),
     );
 
+    $dropdown_menu.on("click", ".search-suggestion", function (e) {
+      e.preventDefault();
+      searchInput.val($(this).attr("data-query")).trigger("focus");
+      run_search();
+    });
+
+    function show_dropdown(html) {
+      $dropdown_menu.html(html);
+      $dropdown_menu.addClass("show");
+      dropdownItems = $dropdown_menu.find(".dropdown-item");
+    }
+
     $("#dropdownMenuSearch, .mobile-search-icon").on("click", () => {
       $("#searchModal").modal();
     });
 
     searchInput.on("keydown", function (e) {
       if (e.key === "ArrowDown") navigate(0);
+      else if (e.key === "Enter") {
+        e.preventDefault();
+        run_search();
+      }
     });
 
     $dropdown_menu.on("keydown", function (e) {
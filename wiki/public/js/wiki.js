@@ -3,11 +3,14 @@ function add_link_to_headings() {
     .not(".revision-content")
     .find("h1, h2, h3, h4, h5, h6")
     .each((i, $heading) => {
-      const text = $heading.textContent.trim();
-      $heading.id = text
-        .replace(/[^\u00C0-\u1FFF\u2C00-\uD7FF\w\- ]/g, "")
-        .replace(/[ ]/g, "-")
-        .toLowerCase();
+      // pages rendered on the server already have unique ids on their headings
+      if (!$heading.id) {
+        const text = $heading.textContent.trim();
+        $heading.id = text
+          .replace(/[^\u00C0-\u1FFF\u2C00-\uD7FF\w\- ]/g, "")
+          .replace(/[ ]/g, "-")
+          .toLowerCase();
+      }
 
       let id = $heading.id;
       let $a = $('<a class="no-underline">')
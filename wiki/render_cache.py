@@ -0,0 +1,94 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import hashlib
+from typing import Any
+
+import frappe
+
+from wiki.utils import LRUCache
+
+# Bump whenever the rendering of markdown changes, frappe's version is part of the key as well
+RENDERER_VERSION = 1
+RENDER_CACHE_KEY = "wiki_markdown_html"
+RENDER_CACHE_TTL = 30 * 24 * 60 * 60
+# process local tier, bounded by the size of the cached html
+RENDER_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class MarkdownRenderCache:
+	"""
+	Rendered html of markdown keyed by a hash of the markdown and the renderer
+	version. A process local LRU, evicted once its html exceeds max_bytes, is
+	in front of the redis cache shared by all workers of the site.
+	"""
+
+	def __init__(self, max_bytes: int):
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.redis_hits = 0
+		self.misses = 0
+		self._entries = LRUCache(max_bytes, sizeof=len)
+
+	@property
+	def size(self) -> int:
+		"""Length of the cached html"""
+		return self._entries.size
+
+	def render(self, markdown: str | None) -> str | None:
+		if not markdown:
+			return frappe.utils.md_to_html(markdown)
+
+		key = self.get_key(markdown)
+		if (html := self._entries.get(key)) is not None:
+			self.hits += 1
+			return html
+
+		redis_key = f"{RENDER_CACHE_KEY}:{key}"
+		if (html := frappe.cache().get_value(redis_key)) is not None:
+			self.redis_hits += 1
+		else:
+			self.misses += 1
+			html = frappe.utils.md_to_html(markdown)
+			# None if the markdown could not be rendered, not cached so it is retried
+			if html is None:
+				return None
+			html = str(html)
+			frappe.cache().set_value(redis_key, html, expires_in_sec=RENDER_CACHE_TTL)
+
+		self._entries.set(key, html)
+		return html
+
+	def get_key(self, markdown: str) -> str:
+		digest = hashlib.blake2b(markdown.encode(), digest_size=16).hexdigest()
+		return f"{RENDERER_VERSION}:{frappe.__version__}:{digest}"
+
+	def clear(self):
+		self._entries.clear()
+
+	def stats(self) -> dict[str, Any]:
+		lookups = self.hits + self.redis_hits + self.misses
+		return {
+			"entries": len(self._entries),
+			"size": self.size,
+			"max_bytes": self.max_bytes,
+			"hits": self.hits,
+			"redis_hits": self.redis_hits,
+			"misses": self.misses,
+			"hit_ratio": round((self.hits + self.redis_hits) / lookups, 3) if lookups else 0,
+		}
+
+
+_render_cache = MarkdownRenderCache(RENDER_CACHE_MAX_BYTES)
+
+
+def render_markdown(markdown: str | None) -> str | None:
+	"""frappe.utils.md_to_html, rendering the same markdown only once"""
+	return _render_cache.render(markdown)
+
+
+@frappe.whitelist()
+def get_render_cache_stats():
+	"""Counters are kept per process, these are of the serving worker"""
+	frappe.only_for("System Manager")
+	return _render_cache.stats()
@@ -3,34 +3,90 @@
 
 
 import json
+import threading
+import time
 
 import frappe
-from frappe.utils import cstr
+from frappe.utils import cint, cstr, now_datetime, update_progress_bar
+from frappe.utils.redis_wrapper import RedisWrapper
+from redis import BlockingConnectionPool
 from redis.commands.search.field import TagField, TextField
 from redis.commands.search.query import Query
 from redis.exceptions import ResponseError
 
+from wiki.utils import get_redis
+
 try:
 	from redis.commands.search.index_definition import IndexDefinition
 except ImportError:
 	from redis.commands.search.indexDefinition import IndexDefinition
 
+# documents written per pipeline round trip during a rebuild
+PIPELINE_BATCH_SIZE = 1000
+# hash field RediSearch reads payloads from
+PAYLOAD_FIELD = "__payload"
+# site config key, size of a connection pool used only for search traffic
+SEARCH_REDIS_POOL_SIZE_CONF = "wiki_search_redis_pool_size"
+
+_instances = {}
+_search_redis_clients = {}
+_lock = threading.Lock()
+
+
+def get_search_redis():
+	"""
+	frappe.cache(), or a client with a dedicated connection pool if its size is
+	set in the site config, so searches don't wait on other cache traffic
+	"""
+	pool_size = cint(frappe.conf.get(SEARCH_REDIS_POOL_SIZE_CONF))
+	if not pool_size:
+		return frappe.cache()
+
+	url = frappe.conf.get("redis_cache")
+	with _lock:
+		if url not in _search_redis_clients:
+			_search_redis_clients[url] = RedisWrapper(
+				connection_pool=BlockingConnectionPool.from_url(url, max_connections=pool_size)
+			)
+		return _search_redis_clients[url]
+
 
 class Search:
+	"""
+	Search over a RediSearch index. index_name is an alias pointing to the
+	live version of the index, rebuild_index writes a new version next to it
+	and swaps the alias once it's complete, so searches never see a partial
+	index. Each version indexes the hashes under its own key prefix.
+	"""
+
 	def __init__(self, index_name, prefix, schema) -> None:
-		self.redis = frappe.cache()
+		self.redis = get_search_redis()
 		self.index_name = index_name
 		self.prefix = prefix
 		self.schema = []
 		for field in schema:
 			self.schema.append(frappe._dict(field))
+		self._metadata = None
+		self._metadata_generation = None
+
+	@classmethod
+	def get_instance(cls):
+		"""
+		Instance shared by all requests of the site in this process, so index
+		metadata is only looked up again after the index changed
+		"""
+		key = (frappe.local.site, cls)
+		with _lock:
+			if key not in _instances:
+				_instances[key] = cls()
+			return _instances[key]
 
-	def create_index(self):
+	def create_index(self, index_name=None, prefix=None):
 		if not IndexDefinition:
 			return
 
 		index_def = IndexDefinition(
-			prefix=[f"{self.redis.make_key(self.prefix).decode()}:"],
+			prefix=[f"{self.redis.make_key(prefix or self.prefix).decode()}:"],
 		)
 		schema = []
 		for field in self.schema:
@@ -39,25 +95,189 @@ class Search:
 				schema.append(TagField(field.name, **kwargs))
 			else:
 				schema.append(TextField(field.name, **kwargs))
-		self.redis.ft(self.index_name).create_index(schema, definition=index_def)
-		self._index_exists = True
+		self.redis.ft(index_name or self.index_name).create_index(schema, definition=index_def)
+		self._invalidate_metadata()
 
 	def add_document(self, id, doc, payload=None):
+		if self.index_exists():
+			self._get_raw_redis().hset(self._get_doc_key(id), mapping=self._get_mapping(doc, payload))
+
+	def remove_document(self, id):
+		if self.index_exists():
+			# RediSearch drops deleted hashes from the index, FT.DEL is deprecated
+			self._get_raw_redis().delete(self._get_doc_key(id))
+
+	def sync_documents(self, documents, removed_ids=()):
+		"""
+		Write documents, an iterable of (id, doc, payload), to the live index and
+		remove the documents with the given ids, in one pipeline. Returns False
+		if there is no index to write to.
+		"""
+		if not self.index_exists():
+			return False
+
+		self._write_documents(self._get_prefix(self._get_metadata().live_version), documents, removed_ids)
+		return True
+
+	def _write_documents(self, prefix, documents, removed_ids=()):
+		pipeline = self._get_raw_redis().pipeline(transaction=False)
+		for id, doc, payload in documents:
+			pipeline.hset(self._get_doc_key(id, prefix), mapping=self._get_mapping(doc, payload))
+		for id in removed_ids:
+			# RediSearch drops deleted hashes from the index, FT.DEL is deprecated
+			pipeline.delete(self._get_doc_key(id, prefix))
+		pipeline.execute()
+
+	def scan_documents(self, field):
+		"""Yield the id and the value of the given field of every document in the live index"""
+		redis = self._get_raw_redis()
+		key_prefix = self._get_doc_key("")
+
+		batch = []
+		for key in redis.scan_iter(match=f"{key_prefix}*", count=PIPELINE_BATCH_SIZE):
+			batch.append(cstr(key))
+			if len(batch) == PIPELINE_BATCH_SIZE:
+				yield from self._get_field_values(batch, key_prefix, field)
+				batch = []
+		yield from self._get_field_values(batch, key_prefix, field)
+
+	def _get_field_values(self, keys, key_prefix, field):
+		pipeline = self._get_raw_redis().pipeline(transaction=False)
+		for key in keys:
+			pipeline.hget(key, field)
+		for key, value in zip(keys, pipeline.execute(), strict=True):
+			yield key[len(key_prefix) :], cstr(value)
+
+	def rebuild_index(self, documents, total=None):
+		"""
+		Index documents, an iterable of (id, doc, payload), into a new version
+		of the index using pipelined writes. Changes that went to the live
+		version meanwhile, see get_pending_changes, are written to the new one
+		as well. The alias is moved to it once all documents are written and
+		the previous version is dropped.
+		"""
+		start = time.monotonic()
+		redis = self._get_raw_redis()
+		previous_index = self.get_live_index()
+
+		version = redis.incr(self.redis.make_key(f"{self.index_name}:version"))
+		index_name, prefix = f"{self.index_name}_v{version}", self._get_prefix(version)
+		self.create_index(index_name, prefix)
+
+		count = 0
+		pipeline = redis.pipeline(transaction=False)
+		for id, doc, payload in documents:
+			pipeline.hset(self._get_doc_key(id, prefix), mapping=self._get_mapping(doc, payload))
+			count += 1
+			if count % PIPELINE_BATCH_SIZE == 0:
+				pipeline.execute()
+				if total and not hasattr(frappe.local, "request"):
+					update_progress_bar(f"Indexing {self.index_name}", count, total, absolute=True)
+		pipeline.execute()
+
+		# writes made during the rebuild went to the previous version
+		self._write_documents(prefix, *self.get_pending_changes())
+		indexed = time.monotonic()
+
+		self._publish_index(index_name, version, previous_index)
+		published = time.monotonic()
+
+		stats = {
+			"docs": count,
+			"version": version,
+			"index_seconds": round(indexed - start, 3),
+			"swap_seconds": round(published - indexed, 3),
+			"total_seconds": round(published - start, 3),
+			"docs_per_second": round(count / (indexed - start), 1) if indexed > start else None,
+			"built_at": now_datetime().isoformat(),
+		}
+		self.redis.set_value(f"{self.index_name}:build_stats", stats)
+		if not hasattr(frappe.local, "request"):
+			print()
+			print(
+				f"Indexed {count} documents into {index_name} in {stats['index_seconds']}s"
+				f" ({stats['docs_per_second']} docs/s), swapped in {stats['swap_seconds']}s"
+			)
+		return stats
+
+	def get_pending_changes(self):
+		"""
+		Documents and removed ids not yet synced to the index, (documents,
+		removed_ids). Replayed into a rebuilt index before it goes live.
+		"""
+		return (), ()
+
+	def get_build_stats(self):
+		return self.redis.get_value(f"{self.index_name}:build_stats") or {}
+
+	def _publish_index(self, index_name, version, previous_index):
+		if previous_index == self.index_name:
+			# index from before versioning, it holds the name the alias needs
+			self.redis.ft(previous_index).dropindex(delete_documents=True)
+			previous_index = None
+
+		# ft() prefixes index names with the site's key prefix, aliases aren't
+		self.redis.ft(index_name).aliasupdate(self.redis.make_key(self.index_name).decode())
+		self._get_raw_redis().set(self.redis.make_key(f"{self.index_name}:live_version"), version)
+		self._invalidate_metadata()
+
+		if previous_index and previous_index != index_name:
+			self.redis.ft(previous_index).dropindex(delete_documents=True)
+
+	def get_live_index(self):
+		"""Name of the index version the alias points to, if any, without the key prefix ft() adds"""
+		try:
+			info = self.redis.ft(self.index_name).info()
+		except ResponseError:
+			return None
+
+		index_name, key_prefix = cstr(info["index_name"]), self.redis.make_key("").decode()
+		return index_name.removeprefix(key_prefix)
+
+	def get_live_version(self):
+		version = self._get_raw_redis().get(self.redis.make_key(f"{self.index_name}:live_version"))
+		return int(version) if version else None
+
+	def _get_prefix(self, version=None):
+		return f"{self.prefix}_v{version}" if version else self.prefix
+
+	def _get_metadata(self):
+		"""
+		Live index and version, cached until the metadata generation in redis
+		is bumped by a change to the index in any process
+		"""
+		generation = self._get_raw_redis().get(self._get_metadata_generation_key())
+		if self._metadata is None or generation != self._metadata_generation:
+			self._metadata = frappe._dict(
+				live_index=self.get_live_index(),
+				live_version=self.get_live_version(),
+			)
+			self._metadata_generation = generation
+		return self._metadata
+
+	def _invalidate_metadata(self):
+		self._get_raw_redis().incr(self._get_metadata_generation_key())
+		self._metadata = None
+
+	def _get_metadata_generation_key(self):
+		return self.redis.make_key(f"{self.index_name}:metadata_generation")
+
+	def _get_doc_key(self, id, prefix=None):
+		prefix = prefix or self._get_prefix(self._get_metadata().live_version)
+		return self.redis.make_key(f"{prefix}:{id}").decode()
+
+	def _get_mapping(self, doc, payload=None):
 		doc = frappe._dict(doc)
-		doc_id = self.redis.make_key(f"{self.prefix}:{id}").decode()
 		mapping = {}
 		for field in self.schema:
 			if field.name in doc:
 				mapping[field.name] = cstr(doc[field.name])
-		if self.index_exists():
-			self.redis.ft(self.index_name).add_document(
-				doc_id, payload=json.dumps(payload), replace=True, **mapping
-			)
+		mapping[PAYLOAD_FIELD] = json.dumps(payload)
+		return mapping
 
-	def remove_document(self, id):
-		key = self.redis.make_key(f"{self.prefix}:{id}").decode()
-		if self.index_exists():
-			self.redis.ft(self.index_name).delete_document(key)
+	def _get_raw_redis(self):
+		# RedisWrapper pickles values, index documents are plain hashes
+		return get_redis(self.redis)
 
 	def search(
 		self,
@@ -67,8 +287,19 @@ class Search:
 		sort_by=None,
 		highlight=False,
 		with_payloads=False,
+		return_fields=None,
+		summarize=None,
 	):
+		"""
+		return_fields limits the fields sent back for each hit and summarize is
+		a dict of Query.summarize arguments, to only send fragments of fields
+		around the matches
+		"""
 		query = Query(query).paging(start, page_length)
+		if return_fields:
+			query = query.return_fields(*return_fields)
+		if summarize:
+			query = query.summarize(**summarize)
 		if highlight:
 			query = query.highlight(tags=['<b class="match">', "</b>"])
 		if sort_by:
@@ -98,16 +329,11 @@ class Search:
 		return self.redis.ft(self.index_name).spellcheck(query, **kwargs)
 
 	def drop_index(self):
-		if self.index_exists():
-			print(f"Dropping index {self.index_name}")
-			self.redis.ft(self.index_name).dropindex(delete_documents=True)
+		if index_name := self.get_live_index():
+			print(f"Dropping index {index_name}")
+			self.redis.ft(index_name).dropindex(delete_documents=True)
+		self._get_raw_redis().delete(self.redis.make_key(f"{self.index_name}:live_version"))
+		self._invalidate_metadata()
 
 	def index_exists(self):
-		self._index_exists = getattr(self, "_index_exists", None)
-		if self._index_exists is None:
-			try:
-				self.redis.ft(self.index_name).info()
-				self._index_exists = True
-			except ResponseError:
-				self._index_exists = False
-		return self._index_exists
+		return self._get_metadata().live_index is not None
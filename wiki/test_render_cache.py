@@ -0,0 +1,52 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from wiki.render_cache import MarkdownRenderCache
+
+
+def render(markdown):
+	return f"<p>{markdown}</p>"
+
+
+class TestMarkdownRenderCache(FrappeTestCase):
+	def get_markdown(self):
+		# unique per run, so nothing is served from the redis tier of earlier runs
+		return frappe.generate_hash(length=30)
+
+	@patch("frappe.utils.md_to_html", side_effect=render)
+	def test_eviction_and_hits(self, md_to_html):
+		cache = MarkdownRenderCache(max_bytes=100)
+		first, second, third = (self.get_markdown() for _ in range(3))
+
+		self.assertEqual(cache.render(first), render(first))
+		cache.render(second)
+		self.assertEqual(cache.size, 74)
+
+		# a third entry exceeds max_bytes, the least recently used one is evicted
+		cache.render(third)
+		self.assertEqual(cache.stats()["entries"], 2)
+		self.assertEqual(cache.size, 74)
+
+		cache.render(second)
+		self.assertEqual(cache.hits, 1)
+
+		# evicted from the process, still in redis
+		self.assertEqual(cache.render(first), render(first))
+		self.assertEqual(cache.redis_hits, 1)
+		self.assertEqual(cache.misses, 3)
+		self.assertEqual(md_to_html.call_count, 3)
+
+	@patch("frappe.utils.md_to_html", return_value=None)
+	def test_failed_render_is_not_cached(self, md_to_html):
+		cache = MarkdownRenderCache(max_bytes=100)
+		markdown = self.get_markdown()
+
+		self.assertIsNone(cache.render(markdown))
+		self.assertIsNone(cache.render(markdown))
+		self.assertEqual(md_to_html.call_count, 2)
+		self.assertEqual(cache.stats()["entries"], 0)
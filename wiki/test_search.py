@@ -0,0 +1,60 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from redis.exceptions import ResponseError
+
+from wiki.search import Search
+
+
+class VersionedSearch(Search):
+	def __init__(self):
+		super().__init__("wiki_test_idx", "wiki_test_doc", [{"name": "title"}])
+
+
+class TestSearch(FrappeTestCase):
+	def setUp(self):
+		try:
+			frappe.cache().execute_command("FT._LIST")
+		except ResponseError:
+			self.skipTest("RediSearch is not available")
+
+		self.search = VersionedSearch()
+
+	def tearDown(self):
+		self.search.drop_index()
+
+	def get_titles(self, query):
+		return [doc.title for doc in self.search.search(query).docs]
+
+	def test_rebuild_swaps_alias(self):
+		first = self.search.rebuild_index([("1", {"title": "marimba"}, None)])
+		# the alias has the key prefix of the site, like the names ft() looks up
+		self.search._get_raw_redis().execute_command("FT.INFO", self.search.redis.make_key("wiki_test_idx"))
+		self.assertEqual(self.search.get_live_index(), f"wiki_test_idx_v{first['version']}")
+		self.assertEqual(self.get_titles("marimba"), ["marimba"])
+
+		second = self.search.rebuild_index([("1", {"title": "xylophone"}, None)])
+		self.assertEqual(self.search.get_live_index(), f"wiki_test_idx_v{second['version']}")
+		self.assertEqual(self.get_titles("xylophone"), ["xylophone"])
+		self.assertEqual(self.get_titles("marimba"), [])
+
+		# the previous version is dropped along with its documents
+		with self.assertRaises(ResponseError):
+			self.search.redis.ft(f"wiki_test_idx_v{first['version']}").info()
+		self.assertFalse(
+			self.search._get_raw_redis().exists(
+				self.search._get_doc_key("1", f"wiki_test_doc_v{first['version']}")
+			)
+		)
+
+	def test_sync_documents(self):
+		self.assertFalse(self.search.sync_documents([("1", {"title": "marimba"}, None)]))
+
+		self.search.rebuild_index([("1", {"title": "marimba"}, None)])
+		self.search.sync_documents([("2", {"title": "marimba xylophone"}, None)], ["1"])
+		self.assertEqual(self.get_titles("marimba"), ["marimba xylophone"])
+
+		self.search.remove_document("2")
+		self.assertEqual(self.get_titles("marimba"), [])
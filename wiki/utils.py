@@ -1,6 +1,17 @@
 import difflib
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
 
 import frappe
+from frappe.utils.redis_wrapper import RedisWrapper
+
+HEADING_ID_UNSAFE_CHARS = re.compile(r"[^\u00C0-\u1FFF\u2C00-\uD7FF\w\- ]")
+HEADING_TAG_PATTERN = re.compile(r"<h([1-6])\b([^>]*)>(.*?)</h\1\s*>", re.IGNORECASE | re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r"<[^>]*>")
+ID_ATTRIBUTE_PATTERN = re.compile(r"""\s+id\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+)""", re.IGNORECASE)
 
 
 def check_app_permission():
@@ -16,6 +27,151 @@ def check_app_permission():
 	return False
 
 
+def get_heading_id(text):
+	"""Anchor of a heading as linked from the table of contents of a page"""
+	return HEADING_ID_UNSAFE_CHARS.sub("", text).replace(" ", "-").lower()
+
+
+def get_unique_heading_id(text, seen):
+	"""Anchor of a heading, suffixed with a counter if one of the seen anchors of the page is the same"""
+	heading_id = base = get_heading_id(text)
+	count = 0
+	while heading_id in seen:
+		count += 1
+		heading_id = f"{base}-{count}"
+	seen.add(heading_id)
+	return heading_id
+
+
+def get_redis(client=None):
+	"""Redis client without the key prefixing and pickling of frappe.cache(), or of the given RedisWrapper"""
+	return super(RedisWrapper, client or frappe.cache())
+
+
+def make_key(key):
+	return frappe.cache().make_key(key)
+
+
+class LRUCache:
+	"""
+	Thread safe, process local LRU cache. Once the size of its entries exceeds
+	maxsize, the least recently used ones are evicted. Every entry has a size
+	of 1 unless sizeof is given, values larger than maxsize are not cached.
+	"""
+
+	def __init__(self, maxsize: int, sizeof: Callable[[Any], int] | None = None):
+		self.maxsize = maxsize
+		self.size = 0
+		self._sizeof = sizeof
+		self._entries: OrderedDict[Any, Any] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		with self._lock:
+			if (value := self._entries.get(key, default)) is not default:
+				self._entries.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		sizeof = self._sizeof or (lambda value: 1)
+		if sizeof(value) > self.maxsize:
+			return
+
+		with self._lock:
+			if key in self._entries:
+				self.size -= sizeof(self._entries.pop(key))
+			self._entries[key] = value
+			self.size += sizeof(value)
+			while self.size > self.maxsize:
+				_, evicted = self._entries.popitem(last=False)
+				self.size -= sizeof(evicted)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.size = 0
+
+
+class VersionedHashCache:
+	"""
+	Structure built from a redis hash and kept by every process of a site.
+	Changes are written to the hash and bump the version key, the process
+	making them applies them to its copy in place and others rebuild theirs
+	from the hash on next use. An empty hash is loaded from the database.
+
+	build is called with the hash as a dict of str, load returns the hash
+	of the site from the database.
+	"""
+
+	def __init__(
+		self, hash_key: str, version_key: str, build: Callable[[dict], Any], load: Callable[[], dict]
+	):
+		self.hash_key = hash_key
+		self.version_key = version_key
+		self.build = build
+		self.load = load
+		self._cached: dict[str, tuple[int, Any]] = {}
+		self._lock = threading.Lock()
+
+	def get(self):
+		redis = get_redis()
+		version = int(redis.get(make_key(self.version_key)) or 0)
+
+		cached = self._cached.get(frappe.local.site)
+		if cached and cached[0] == version:
+			return cached[1]
+
+		values = {k.decode(): v.decode() for k, v in redis.hgetall(make_key(self.hash_key)).items()}
+		if not values:
+			values = self.load()
+			# don't overwrite values updated meanwhile
+			pipeline = redis.pipeline()
+			for field, value in values.items():
+				pipeline.hsetnx(make_key(self.hash_key), field, value)
+			pipeline.execute()
+
+		value = self.build(values)
+		with self._lock:
+			self._cached[frappe.local.site] = (version, value)
+		return value
+
+	def update(self, values: dict[str, str], deleted=(), apply: Callable[[Any], None] | None = None):
+		"""Set and delete fields of the hash, apply makes the same change to the structure of this process"""
+		redis = get_redis()
+		key = make_key(self.hash_key)
+
+		# the hash is loaded from the database as a whole, don't start it with a few fields
+		if redis.exists(key):
+			pipeline = redis.pipeline()
+			if deleted:
+				pipeline.hdel(key, *deleted)
+			if values:
+				pipeline.hset(key, mapping=values)
+			pipeline.execute()
+		self.bump(apply)
+
+	def bump(self, apply: Callable[[Any], None] | None = None):
+		"""Make other processes rebuild their structure, apply updates the one of this process"""
+		version = get_redis().incr(make_key(self.version_key))
+
+		with self._lock:
+			cached = self._cached.get(frappe.local.site)
+			if not apply or not cached or cached[0] != version - 1:
+				return
+
+			apply(cached[1])
+			self._cached[frappe.local.site] = (version, cached[1])
+
+	def clear(self):
+		"""Reload the hash from the database on next use, eg. after a migration"""
+		redis = get_redis()
+		redis.delete(make_key(self.hash_key))
+		redis.incr(make_key(self.version_key))
+
+
 def apply_markdown_diff(original_md, modified_md):
 	"""
 	Compares two markdown texts, finds the differences, and applies them to the original text.
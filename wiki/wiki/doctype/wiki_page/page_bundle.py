@@ -0,0 +1,108 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import hashlib
+
+import frappe
+
+from wiki.render_cache import render_markdown
+from wiki.wiki.doctype.wiki_page.page_routes import invalidate_first_pages
+
+# Bump whenever the way pages are compiled changes, bundles of an older version are recompiled
+BUNDLE_VERSION = 2
+BUNDLE_KEY = "wiki_page_bundle"
+# changes with every change to a sidebar, prev/next neighbours of older bundles are looked up again
+SIDEBAR_VERSION_KEY = "wiki_sidebar_version"
+
+
+def get_page_bundle(page) -> frappe._dict:
+	"""
+	Compiled page: HTML with heading ids, TOC HTML, word count and its prev/next
+	neighbours in the sidebar. Bundles are compiled when a page is saved and
+	served as long as their stamp matches the content of the page, pages
+	changed without being saved are compiled on their first view.
+	"""
+	bundle = frappe.cache().hget(BUNDLE_KEY, page.name)
+	stamp = get_bundle_stamp(page)
+
+	if not bundle or bundle.stamp != stamp:
+		return compile_page(page)
+
+	if bundle.sidebar_version != get_sidebar_version():
+		set_neighbours(bundle, page.name)
+		frappe.cache().hset(BUNDLE_KEY, page.name, bundle)
+
+	return bundle
+
+
+def compile_page(page) -> frappe._dict:
+	"""Render the page once and store its bundle"""
+	html = render_markdown(page.content)
+	html, toc_html, word_count = page.compile_html(html)
+
+	bundle = frappe._dict(
+		stamp=get_bundle_stamp(page),
+		html=html,
+		toc_html=toc_html,
+		word_count=word_count,
+	)
+	set_neighbours(bundle, page.name)
+	frappe.cache().hset(BUNDLE_KEY, page.name, bundle)
+	return bundle
+
+
+def set_neighbours(bundle: frappe._dict, page_name: str):
+	"""Previous and next visible pages in the sidebar of the page"""
+	bundle.sidebar_version = get_sidebar_version()
+	bundle.prev_page = bundle.next_page = None
+
+	wiki_space_name = frappe.get_value("Wiki Group Item", {"wiki_page": page_name}, "parent")
+	if not wiki_space_name:
+		return
+
+	sidebar_items = frappe.get_all(
+		"Wiki Group Item",
+		filters={"parent": wiki_space_name, "hide_on_sidebar": 0},
+		pluck="wiki_page",
+		order_by="idx",
+	)
+	if page_name not in sidebar_items:
+		return
+
+	idx = sidebar_items.index(page_name)
+	if idx > 0:
+		bundle.prev_page = frappe.get_value(
+			"Wiki Page", sidebar_items[idx - 1], ["title", "route"], as_dict=True
+		)
+	if idx < len(sidebar_items) - 1:
+		bundle.next_page = frappe.get_value(
+			"Wiki Page", sidebar_items[idx + 1], ["title", "route"], as_dict=True
+		)
+
+
+def get_bundle_stamp(page) -> str:
+	digest = hashlib.blake2b(f"{page.title}\0{page.content}".encode(), digest_size=16).hexdigest()
+	return f"{BUNDLE_VERSION}:{digest}"
+
+
+def get_sidebar_version() -> str:
+	if not (version := frappe.cache().get_value(SIDEBAR_VERSION_KEY)):
+		version = bump_sidebar_version()
+	return version
+
+
+def invalidate_neighbours():
+	"""Call on any change to sidebars, their order or the titles and routes of their pages"""
+	frappe.db.after_commit.add(bump_sidebar_version)
+	# spaces redirect to the first page of their sidebar
+	invalidate_first_pages()
+
+
+def bump_sidebar_version() -> str:
+	version = frappe.generate_hash(length=10)
+	frappe.cache().set_value(SIDEBAR_VERSION_KEY, version)
+	return version
+
+
+def clear_page_bundle(page_name: str):
+	frappe.cache().hdel(BUNDLE_KEY, page_name)
@@ -0,0 +1,139 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import json
+
+import frappe
+
+from wiki.utils import VersionedHashCache, get_redis, make_key
+
+# Wiki Pages are kept in a redis hash of route -> page and the first page of
+# every Wiki Space in a hash of space -> page name, every process resolves
+# routes through a route map built from them
+PAGE_ROUTES_KEY = "wiki_page_routes"
+FIRST_PAGES_KEY = "wiki_space_first_pages"
+PAGE_ROUTES_VERSION_KEY = "wiki_page_routes_version"
+PAGE_FIELDS = ("name", "title", "published", "allow_guest")
+
+
+class RouteMap:
+	"""
+	Wiki Pages by route, with a reverse index by name, and the first page in
+	the sidebar of every Wiki Space, loaded on first use
+	"""
+
+	__slots__ = ("first_pages", "names", "routes")
+
+	def __init__(self, routes: dict[str, frappe._dict]):
+		self.routes = routes
+		self.names = {page.name: route for route, page in routes.items()}
+		self.first_pages: dict[str, str] | None = None
+
+	def get_page(self, route: str) -> frappe._dict | None:
+		return self.routes.get((route or "").strip("/"))
+
+	def get_first_page_route(self, space_name: str) -> str | None:
+		if self.first_pages is None:
+			self.first_pages = _load_first_pages()
+		return self.names.get(self.first_pages.get(space_name))
+
+	def set_page(
+		self, route: str | None, page: dict | None, old_route: str | None = None, old_name: str | None = None
+	):
+		if (
+			old_route
+			and (old := self.routes.get(old_route))
+			and (not page or old.name in (page["name"], old_name))
+		):
+			del self.routes[old_route]
+			self.names.pop(old.name, None)
+		if page:
+			self.routes[route] = frappe._dict(page)
+			self.names[page["name"]] = route
+
+
+def get_route_map() -> RouteMap:
+	return _route_maps.get()
+
+
+def get_page(route: str) -> frappe._dict | None:
+	"""Name, title, published and allow_guest of the Wiki Page at the route"""
+	return get_route_map().get_page(route)
+
+
+def get_first_page_route(space_name: str) -> str | None:
+	"""Route of the first page in the sidebar of the Wiki Space"""
+	return get_route_map().get_first_page_route(space_name)
+
+
+def update_page_route(
+	route: str | None, page: dict | None, old_route: str | None = None, old_name: str | None = None
+):
+	"""
+	Track a new, moved (route is changed), renamed (old_name is set) or
+	deleted (page is None) Wiki Page after the commit
+	"""
+	if page:
+		page = {field: page.get(field) for field in PAGE_FIELDS}
+	frappe.db.after_commit.add(lambda: _update_page_route(route, page, old_route, old_name))
+
+
+def _update_page_route(route, page, old_route, old_name=None):
+	_route_maps.update(
+		{route: json.dumps(page)} if page else {},
+		deleted=[old_route] if old_route and old_route != route else [],
+		apply=lambda route_map: route_map.set_page(route, page, old_route, old_name),
+	)
+
+
+def invalidate_first_pages():
+	"""Call on any change to the sidebars of Wiki Spaces or their order"""
+	frappe.db.after_commit.add(_clear_first_pages)
+
+
+def _clear_first_pages():
+	get_redis().delete(make_key(FIRST_PAGES_KEY))
+	_route_maps.bump(apply=lambda route_map: setattr(route_map, "first_pages", None))
+
+
+def _load_first_pages() -> dict[str, str]:
+	redis = get_redis()
+	first_pages = {k.decode(): v.decode() for k, v in redis.hgetall(make_key(FIRST_PAGES_KEY)).items()}
+	if first_pages:
+		return first_pages
+
+	for space_name, page_name in frappe.get_all(
+		"Wiki Group Item",
+		filters={"parenttype": "Wiki Space"},
+		fields=["parent", "wiki_page"],
+		order_by="parent, idx",
+		as_list=True,
+	):
+		first_pages.setdefault(space_name, page_name)
+
+	if first_pages:
+		pipeline = redis.pipeline()
+		for space_name, page_name in first_pages.items():
+			pipeline.hsetnx(make_key(FIRST_PAGES_KEY), space_name, page_name)
+		pipeline.execute()
+	return first_pages
+
+
+def _build_route_map(pages: dict[str, str]) -> RouteMap:
+	return RouteMap({route: frappe._dict(json.loads(page)) for route, page in pages.items()})
+
+
+def _load_pages() -> dict[str, str]:
+	return {
+		page.pop("route"): json.dumps(page)
+		for page in frappe.get_all("Wiki Page", fields=["route", *PAGE_FIELDS])
+	}
+
+
+_route_maps = VersionedHashCache(PAGE_ROUTES_KEY, PAGE_ROUTES_VERSION_KEY, _build_route_map, _load_pages)
+
+
+def clear_page_routes():
+	"""Reload the routes from the database on next use, eg. after a migration"""
+	get_redis().delete(make_key(FIRST_PAGES_KEY))
+	_route_maps.clear()
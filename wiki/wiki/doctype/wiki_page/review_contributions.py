@@ -2,6 +2,7 @@ import frappe
 from frappe import _
 from frappe.utils import cint
 
+from wiki.render_cache import render_markdown
 from wiki.utils import apply_changes, apply_markdown_diff, highlight_changes
 
 
@@ -83,5 +84,5 @@ def get_patch_diff(patch):
 		"diff": highlight_changes(original_md, new_modified_md),
 		"raised_by": patch_doc.raised_by,
 		"raised_on": frappe.utils.pretty_date(patch_doc.modified),
-		"merged_html": frappe.utils.md_to_html(merge_new_content),
+		"merged_html": render_markdown(merge_new_content),
 	}
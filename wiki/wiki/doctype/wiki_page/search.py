@@ -2,14 +2,58 @@
 # MIT License. See license.txt
 
 
+import contextlib
+import threading
+import time
+
 import frappe
-from frappe.utils import strip_html_tags, update_progress_bar
-from frappe.utils.redis_wrapper import RedisWrapper
+from frappe.utils import cint, now_datetime
+from frappe.utils.background_jobs import get_job_status, is_job_enqueued
 
+from wiki.utils import get_redis, make_key
+from wiki.wiki.doctype.wiki_page.search_cache import SearchResultCache
+from wiki.wiki.doctype.wiki_page.search_telemetry import end_trace, get_telemetry, get_trace, start_trace
 from wiki.wiki_search import WikiSearch
 
-PREFIX = "wiki_page_search_doc"
-INDEX_BUILD_FLAG = "wiki_page_index_in_progress"
+# Wiki Pages waiting to be re-indexed are kept in a redis set and drained by a
+# single indexer job per site, which holds a lease while it runs
+INDEX_JOB_ID = "wiki_search_indexer"
+# queued behind a running indexer, which may have checked the queue for the last time already
+INDEX_FOLLOWUP_JOB_ID = "wiki_search_indexer_followup"
+INDEX_QUEUE_KEY = "wiki_search_index_queue"
+INDEX_REBUILD_KEY = "wiki_search_index_rebuild"
+INDEX_LAST_CHANGE_KEY = "wiki_search_index_last_change"
+INDEX_LEASE_KEY = "wiki_search_index_lease"
+INDEX_STATUS_KEY = "wiki_search_index_status"
+INDEX_RECONCILE_KEY = "wiki_search_index_reconcile"
+INDEX_BATCH_SIZE = 500
+INDEX_LEASE_SECONDS = 15 * 60
+# a full rebuild may take longer than the lease, it is extended while it runs
+INDEX_LEASE_RENEW_SECONDS = 60
+INDEX_DEBOUNCE_SECONDS = 5
+INDEX_MAX_DEBOUNCE_SECONDS = 60
+
+# bumped on every change to the index, search results are cached per generation
+INDEX_GENERATION_KEY = "wiki_search_index_generation"
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL = 5 * 60
+
+# redisearch only returns a fragment of the content around the matches of each hit
+REDIS_SEARCH_SUMMARY = {"fields": ["content"], "context_len": 24, "num_frags": 1, "separator": "..."}
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+	return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+EXTEND_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+	return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
 
 
 _redisearch_available = False
@@ -21,6 +65,9 @@ except ImportError:
 	pass
 
 
+_search_cache = SearchResultCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
 @frappe.whitelist(allow_guest=True)
 def get_spaces():
 	return frappe.db.get_all("Wiki Space", pluck="route")
@@ -31,36 +78,131 @@ def search(
 	query: str,
 	path: str | None = None,
 	space: str | None = None,
+	limit: int = 20,
+	offset: int = 0,
+):
+	if not space and path:
+		space = get_space_route(path)
+
+	limit, offset = cint(limit), cint(offset)
+	engine = get_search_engine()
+	guest = frappe.session.user == "Guest"
+	if guest and is_guest_access_disabled():
+		return {"docs": [], "total": 0, "search_engine": engine}
+
+	trace = start_trace()
+	try:
+		result, cached = _search(query, space, limit, offset, guest, engine)
+		if trace:
+			get_telemetry().record(engine, query, trace, result.get("total", len(result["docs"])), cached)
+		return result
+	finally:
+		end_trace()
+
+
+def _search(query, space, limit, offset, guest, engine):
+	"""Results of the query and whether they were cached"""
+	cache_key = (
+		frappe.local.site,
+		engine,
+		" ".join(query.split()),
+		space or None,
+		limit,
+		offset,
+		guest,
+		get_index_generation(),
+	)
+
+	result = _search_cache.get(cache_key)
+	get_trace().mark("cache")
+	if result is not None:
+		return result, True
+
+	if engine == "sqlite_fts":
+		result = sqlite_search(query, space, limit, offset, guest)
+	elif engine == "redisearch":
+		result = redis_search(query, space, limit, offset, guest)
+	else:
+		result = web_search(query, space, guest)
+
+	_search_cache.set(cache_key, result)
+	return result, False
+
+
+@frappe.whitelist(allow_guest=True)
+def suggest(
+	query: str,
+	path: str | None = None,
+	space: str | None = None,
+	limit: int = 8,
 ):
+	"""Search as you type completions, only the sqlite index has the term list they are built from"""
+	guest = frappe.session.user == "Guest"
+	if get_search_engine() != "sqlite_fts" or (guest and is_guest_access_disabled()):
+		return {"terms": [], "pages": []}
+
 	if not space and path:
 		space = get_space_route(path)
 
+	from wiki.wiki.doctype.wiki_page.sqlite_search import suggest
+
+	return suggest(query, space, cint(limit), guest=guest)
+
+
+def is_guest_access_disabled():
+	return frappe.db.get_single_value("Wiki Settings", "disable_guest_access")
+
+
+def get_search_engine():
 	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search"):
-		return sqlite_search(query, space)
+		return "sqlite_fts"
 
 	if use_redis_search():
-		return redis_search(query, space)
+		return "redisearch"
+
+	return "frappe_web_search"
 
-	return web_search(query, space)
+
+def get_index_generation():
+	return cint(get_redis().get(make_key(INDEX_GENERATION_KEY)))
+
+
+def bump_index_generation():
+	"""Invalidate cached search results, call after every change to the index"""
+	get_redis().incr(make_key(INDEX_GENERATION_KEY))
 
 
 def use_redis_search():
 	return frappe.db.get_single_value("Wiki Settings", "use_redisearch_for_search") and _redisearch_available
 
 
-def sqlite_search(query, space):
+def sqlite_search(query, space, limit=20, offset=0, guest=False):
 	from wiki.wiki.doctype.wiki_page.sqlite_search import search
 
+	result = search(query, space, limit=limit, offset=offset, guest=guest)
 	return {
-		"docs": search(query, space),
+		"docs": result["docs"],
+		"total": result["total"],
+		"corrected_query": result.get("corrected_query"),
 		"search_engine": "sqlite_fts",
 	}
 
 
-def web_search(query, space):
+def web_search(query, space, guest=False):
 	from frappe.search import web_search
 
 	result = web_search(query, space)
+	get_trace().mark("match")
+	if guest:
+		# the global search table has no notion of guest access, filter its results instead
+		guest_pages = set(
+			frappe.get_all(
+				"Wiki Page",
+				filters={"name": ("in", [d.name for d in result]), "allow_guest": 1},
+				pluck="name",
+			)
+		)
+		result = [d for d in result if d.name in guest_pages]
 
 	for d in result:
 		d.title = d.title_highlights or d.title
@@ -77,10 +219,8 @@ def web_search(query, space):
 	}
 
 
-def redis_search(query, space):
-	from wiki.wiki_search import WikiSearch
-
-	search = WikiSearch()
+def redis_search(query, space, limit=20, offset=0, guest=False):
+	search = WikiSearch.get_instance()
 	search_query = search.clean_query(query)
 	query_parts = search_query.split(" ")
 
@@ -88,15 +228,21 @@ def redis_search(query, space):
 		search_query = f"{query_parts[0]}*"
 	if len(query_parts) > 1:
 		search_query = " ".join([f"%%{q}%%" for q in query_parts])
+	get_trace().mark("clean")
 
 	result = search.search(
 		f"@title|content:({search_query})",
 		space=space,
-		start=0,
+		guest=guest,
+		start=offset,
+		page_length=limit,
 		sort_by="modified desc",
 		highlight=True,
-		with_payloads=True,
+		return_fields=["title", "content", "route"],
+		summarize=REDIS_SEARCH_SUMMARY,
 	)
+	# matches are highlighted and summarized by redisearch as part of the search
+	get_trace().mark("match")
 
 	docs = []
 	for doc in result.docs:
@@ -109,98 +255,287 @@ def redis_search(query, space):
 			}
 		)
 
-	return {"docs": docs, "search_engine": "redisearch"}
+	return {"docs": docs, "total": result.total, "search_engine": "redisearch"}
 
 
 def get_space_route(path):
-	for space in frappe.db.get_all("Wiki Space", pluck="route"):
-		if space in path:
-			return space
+	from wiki.wiki.doctype.wiki_space.space_routes import get_space_route
 
+	return get_space_route(path)
 
-def create_index_for_records(records, space):
-	r = frappe.cache()
-	for i, d in enumerate(records):
-		if not hasattr(frappe.local, "request") and len(records) > 10:
-			update_progress_bar(f"Indexing Wiki Pages - {space}", i, len(records), absolute=True)
 
-		key = r.make_key(f"{PREFIX}{space}:{d.name}").decode()
-		mapping = {
-			"title": d.title,
-			"content": strip_html_tags(d.content),
-			"route": d.route,
-		}
-		super(RedisWrapper, r).hset(key, mapping=mapping)
+def drop_index(space: str | None = None):
+	bump_index_generation()
 
+	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search"):
+		from wiki.wiki.doctype.wiki_page.sqlite_search import delete_db
+
+		return delete_db()
+
+	if use_redis_search():
+		return WikiSearch.get_instance().drop_index()
+
+	if not space:
+		return
 
-def remove_index_for_records(records, space):
 	from redis.exceptions import ResponseError
 
-	r = frappe.cache()
-	for d in records:
+	try:
+		frappe.cache().ft(space).dropindex(delete_documents=True)
+	except ResponseError:
+		pass
+
+
+def build_index_in_background():
+	"""Schedule a full rebuild of the search index, used to repair it"""
+	queue_index_rebuild()
+	print(f"Queued rebuilding of search index for {frappe.local.site}")
+
+
+def queue_index_rebuild():
+	get_redis().set(make_key(INDEX_REBUILD_KEY), 1)
+	schedule_index_update()
+
+
+def request_index_rebuild():
+	"""
+	Queue a rebuild of a missing or outdated index found by a search, unless
+	one is queued already or an indexer is running, which may be rebuilding it
+	"""
+	redis = get_redis()
+	if redis.exists(make_key(INDEX_LEASE_KEY)):
+		return
+
+	if redis.set(make_key(INDEX_REBUILD_KEY), 1, nx=True):
+		schedule_index_update()
+
+
+def update_index_in_background(names):
+	"""Mark the given Wiki Pages for re-indexing once the transaction commits"""
+	names = [name for name in names if name]
+	if not names:
+		return
+
+	frappe.db.after_commit.add(lambda: _queue_pages(names))
+
+
+def _queue_pages(names):
+	redis = get_redis()
+	redis.sadd(make_key(INDEX_QUEUE_KEY), *names)
+	redis.set(make_key(INDEX_LAST_CHANGE_KEY), time.time())
+	schedule_index_update()
+
+
+def get_queued_pages():
+	"""Wiki Pages waiting to be re-indexed, without taking them off the queue"""
+	return [name.decode() for name in get_redis().smembers(make_key(INDEX_QUEUE_KEY))]
+
+
+def schedule_index_update():
+	"""Enqueue the indexer, unless one is already queued and yet to start"""
+	statuses = [get_job_status(job_id) for job_id in (INDEX_JOB_ID, INDEX_FOLLOWUP_JOB_ID)]
+	if "queued" in statuses:
+		return
+
+	for job_id, status in zip((INDEX_JOB_ID, INDEX_FOLLOWUP_JOB_ID), statuses, strict=True):
+		if status != "started":
+			frappe.enqueue(process_index_queue, queue="long", job_id=job_id, deduplicate=True)
+			return
+
+
+def schedule_pending_index_updates():
+	"""Scheduled job, only enqueues the indexer if something changed"""
+	if _has_pending_index_work():
+		schedule_index_update()
+
+
+def process_index_queue():
+	"""
+	Drain the queue of Wiki Pages to be re-indexed in batches. Only one indexer
+	runs per site at a time, concurrent jobs return right away and leave the
+	queue to the lease holder.
+	"""
+	token = frappe.generate_hash()
+	status = frappe._dict(started_at=now_datetime().isoformat(), pages=0, full_rebuild=False)
+
+	while _has_pending_index_work():
+		if not _acquire_lease(token):
+			break
+
+		try:
+			_wait_for_quiet_period()
+			_drain_index_queue(token, status)
+		finally:
+			_release_lease(token)
+
+	# pages queued since the last check of the loop are left to a follow-up job
+	if _has_pending_index_work():
+		schedule_index_update()
+
+	# status of the last run that did something
+	if status.pages or status.full_rebuild:
+		status.finished_at = now_datetime().isoformat()
+		frappe.cache().set_value(INDEX_STATUS_KEY, status)
+
+
+def _drain_index_queue(token, status):
+	redis = get_redis()
+	queue_key = make_key(INDEX_QUEUE_KEY)
+	rebuild_key = make_key(INDEX_REBUILD_KEY)
+
+	# stops once the lease expired and was taken over by another indexer
+	while _extend_lease(token):
+		if redis.delete(rebuild_key):
+			# a full rebuild picks up every queued page as well, pages queued while it runs are kept
+			pipeline = redis.pipeline()
+			pipeline.smembers(queue_key)
+			pipeline.delete(queue_key)
+			queued = pipeline.execute()[0]
+
+			try:
+				with _keep_lease(token):
+					build_index()
+			except Exception:
+				redis.set(rebuild_key, 1)
+				if queued:
+					redis.sadd(queue_key, *queued)
+				raise
+
+			status.full_rebuild = True
+			continue
+
+		names = [name.decode() for name in redis.spop(queue_key, INDEX_BATCH_SIZE) or []]
+		if not names:
+			return
+
 		try:
-			key = r.make_key(f"{PREFIX}{space}:{d.name}").decode()
-			r.ft(space).delete_document(key)
-		except ResponseError:
-			pass
+			update_index(names)
+		except Exception:
+			redis.sadd(queue_key, *names)
+			raise
+
+		status.pages += len(names)
+
 
+def _wait_for_quiet_period():
+	"""Debounce bursts of edits, without waiting forever on a busy site"""
+	deadline = time.time() + INDEX_MAX_DEBOUNCE_SECONDS
+	while time.time() < deadline:
+		last_change = float(get_redis().get(make_key(INDEX_LAST_CHANGE_KEY)) or 0)
+		wait = min(last_change + INDEX_DEBOUNCE_SECONDS, deadline) - time.time()
+		if wait <= 0:
+			return
+		time.sleep(wait)
 
-def update_index(doc):
-	record = frappe._dict({"name": doc.name, "title": doc.title, "content": doc.content, "route": doc.route})
-	space = get_space_route(doc.route)
 
-	create_index_for_records([record], space)
+def _has_pending_index_work():
+	redis = get_redis()
+	return bool(redis.exists(make_key(INDEX_REBUILD_KEY)) or redis.scard(make_key(INDEX_QUEUE_KEY)))
 
 
-def remove_index(doc):
-	record = frappe._dict(
-		{
-			"name": doc.name,
-			"route": doc.route,
-		}
+def _acquire_lease(token):
+	return get_redis().set(make_key(INDEX_LEASE_KEY), token, nx=True, ex=INDEX_LEASE_SECONDS)
+
+
+def _extend_lease(token):
+	"""Extend the lease if it is still held with the token, returns False if it was lost"""
+	return bool(
+		get_redis().eval(EXTEND_LEASE_SCRIPT, 1, make_key(INDEX_LEASE_KEY), token, INDEX_LEASE_SECONDS)
 	)
-	space = get_space_route(doc.route)
 
-	remove_index_for_records([record], space)
 
+@contextlib.contextmanager
+def _keep_lease(token):
+	"""Extend the lease from a background thread while the block runs"""
+	# frappe.local isn't set up in the thread, resolve the client and key here
+	redis, lease_key = get_redis(), make_key(INDEX_LEASE_KEY)
+	done = threading.Event()
+
+	def renew():
+		while not done.wait(INDEX_LEASE_RENEW_SECONDS):
+			if not redis.eval(EXTEND_LEASE_SCRIPT, 1, lease_key, token, INDEX_LEASE_SECONDS):
+				return
+
+	thread = threading.Thread(target=renew, daemon=True)
+	thread.start()
+	try:
+		yield
+	finally:
+		done.set()
+		thread.join()
+
+
+def _release_lease(token):
+	get_redis().eval(RELEASE_LEASE_SCRIPT, 1, make_key(INDEX_LEASE_KEY), token)
+
+
+@frappe.whitelist()
+def get_index_status():
+	frappe.only_for("System Manager")
+
+	redis = get_redis()
+	lease_key = make_key(INDEX_LEASE_KEY)
+	status = {
+		"queue_depth": redis.scard(make_key(INDEX_QUEUE_KEY)),
+		"rebuild_pending": bool(redis.exists(make_key(INDEX_REBUILD_KEY))),
+		"job_enqueued": is_job_enqueued(INDEX_JOB_ID) or is_job_enqueued(INDEX_FOLLOWUP_JOB_ID),
+		"indexer_running": bool(redis.exists(lease_key)),
+		"lease_expires_in": max(redis.ttl(lease_key), 0),
+		"last_run": frappe.cache().get_value(INDEX_STATUS_KEY),
+		"index_generation": get_index_generation(),
+		# hit/miss counters are kept per process, these are of the serving worker
+		"result_cache": _search_cache.stats(),
+	}
 
-def drop_index(space: str | None = None):
 	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search"):
-		from wiki.wiki.doctype.wiki_page.sqlite_search import delete_db
+		from wiki.wiki.doctype.wiki_page.sqlite_search import get_build_stats, get_index_stats
 
-		return delete_db()
+		status["last_update"] = get_index_stats()
+		status["last_build"] = get_build_stats()
 
-	if use_redis_search():
-		return WikiSearch().drop_index()
+	elif use_redis_search():
+		status["last_build"] = WikiSearch.get_instance().get_build_stats()
+		status["last_reconcile"] = frappe.cache().get_value(INDEX_RECONCILE_KEY)
 
-	if not space:
-		return
+	return status
 
-	from redis.exceptions import ResponseError
 
-	try:
-		frappe.cache().ft(space).dropindex(delete_documents=True)
-	except ResponseError:
-		pass
+def update_index(names):
+	"""Re-index only the given Wiki Pages, where the search engine supports it"""
+	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search"):
+		from wiki.wiki.doctype.wiki_page.sqlite_search import update_index
 
+		update_index(names)
 
-def build_index_in_background():
-	if frappe.cache().get_value(INDEX_BUILD_FLAG):
+	elif use_redis_search() and not WikiSearch.get_instance().update_documents(names):
+		# no index to update yet, fall back to one full rebuild
+		get_redis().set(make_key(INDEX_REBUILD_KEY), 1)
 		return
 
-	print(f"Queued rebuilding of search index for {frappe.local.site}")
-	frappe.enqueue(build_index, queue="long")
+	bump_index_generation()
+
+
+def reconcile_index():
+	"""Scheduled, fixes RediSearch documents that drifted from the database without a full rebuild"""
+	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search") or not use_redis_search():
+		return
+
+	result = WikiSearch.get_instance().reconcile()
+	if result["updated"] or result["removed"]:
+		bump_index_generation()
 
+	frappe.cache().set_value(INDEX_RECONCILE_KEY, {**result, "reconciled_at": now_datetime().isoformat()})
+	return result
 
-def build_index():
-	frappe.cache().set_value(INDEX_BUILD_FLAG, True)
 
+def build_index(space: str | None = None):
+	"""Rebuild the search index, only the pages of the given space route for sqlite"""
 	if frappe.db.get_single_value("Wiki Settings", "use_sqlite_for_search"):
 		from wiki.wiki.doctype.wiki_page.sqlite_search import build_index
 
-		return build_index()
+		build_index(space)
 
-	if use_redis_search():
-		return WikiSearch().build_index()
+	elif use_redis_search():
+		WikiSearch.get_instance().build_index()
 
-	frappe.cache().set_value(INDEX_BUILD_FLAG, False)
+	bump_index_generation()
@@ -0,0 +1,53 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import time
+from typing import Any
+
+from wiki.utils import LRUCache
+
+
+class SearchResultCache:
+	"""
+	Process local LRU cache for search results. Keys are expected to carry the
+	index generation, so entries of an outdated index are never hit and simply
+	age out. Entries also expire after `ttl` seconds, for engines like frappe's
+	web search whose index changes are not tracked.
+	"""
+
+	def __init__(self, maxsize: int, ttl: int):
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._entries = LRUCache(maxsize)
+
+	@property
+	def maxsize(self) -> int:
+		return self._entries.maxsize
+
+	def get(self, key: tuple) -> Any | None:
+		entry = self._entries.get(key)
+		# an expired entry is replaced once the search is cached again
+		if entry and entry[0] > time.monotonic():
+			self.hits += 1
+			return entry[1]
+
+		self.misses += 1
+		return None
+
+	def set(self, key: tuple, value: Any):
+		self._entries.set(key, (time.monotonic() + self.ttl, value))
+
+	def clear(self):
+		self._entries.clear()
+
+	def stats(self) -> dict[str, Any]:
+		lookups = self.hits + self.misses
+		return {
+			"size": len(self._entries),
+			"maxsize": self.maxsize,
+			"ttl": self.ttl,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_ratio": round(self.hits / lookups, 3) if lookups else 0,
+		}
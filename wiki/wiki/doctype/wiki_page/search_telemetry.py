@@ -0,0 +1,265 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Any
+
+import frappe
+from frappe.utils import cint
+
+from wiki.utils import get_redis, make_key
+
+# Queries are aggregated in process and flushed to redis by the first query
+# after FLUSH_INTERVAL seconds, so recording a query never costs a round trip
+FLUSH_INTERVAL = 10
+# Only one in every SAMPLE_EVERY searches is traced and recorded, counted
+# SAMPLE_EVERY times. Set to 1 in site config to record every search, 0 to
+# turn telemetry off.
+SAMPLE_EVERY_CONF = "wiki_search_telemetry_sample_every"
+DEFAULT_SAMPLE_EVERY = 10
+TELEMETRY_KEY = "wiki_search_telemetry"
+SLOW_QUERIES_KEY = "wiki_search_slow_queries"
+ZERO_RESULT_QUERIES_KEY = "wiki_search_zero_result_queries"
+
+# upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+# integer bounds are much cheaper to bisect, durations above the last one fall in the inf bucket
+LATENCY_BUCKETS_NS = tuple(int(ms * 1_000_000) for ms in LATENCY_BUCKETS_MS[:-1])
+STAGES = ("cache", "clean", "match", "fuzzy", "rerank", "highlight", "total")
+COUNTERS = ("cache_hits", "zero_results")
+SLOW_QUERY_MS = 100
+TOP_QUERIES = 50
+
+
+class QueryTrace:
+	"""
+	Timings of the stages of one search. Engines call mark(stage) once a stage
+	is done, the time since the previous mark is added to it.
+	"""
+
+	__slots__ = ("last", "stages", "start", "weight")
+
+	def __init__(self, weight: int = 1):
+		# number of searches this one was sampled for
+		self.weight = weight
+		self.start = self.last = time.perf_counter_ns()
+		self.stages: dict[str, int] = {}
+
+	def mark(self, stage: str):
+		now = time.perf_counter_ns()
+		self.stages[stage] = self.stages.get(stage, 0) + now - self.last
+		self.last = now
+
+
+class _NoTrace:
+	__slots__ = ()
+
+	def mark(self, stage: str):
+		pass
+
+
+NO_TRACE = _NoTrace()
+_local = threading.local()
+_searches = itertools.count()
+
+
+def get_trace() -> QueryTrace | _NoTrace:
+	"""Trace of the search running in this thread, marks are ignored unless it is sampled"""
+	return getattr(_local, "trace", None) or NO_TRACE
+
+
+def start_trace() -> QueryTrace | None:
+	"""Starts tracing the search in this thread, if it is sampled"""
+	sample_every = cint(frappe.conf.get(SAMPLE_EVERY_CONF, DEFAULT_SAMPLE_EVERY))
+	if sample_every < 1 or next(_searches) % sample_every:
+		_local.trace = None
+	else:
+		_local.trace = QueryTrace(sample_every)
+	return _local.trace
+
+
+def end_trace():
+	_local.trace = None
+
+
+def get_query_shape(query: str) -> str:
+	if '"' in query:
+		return "phrase"
+	padded = f" {query} "
+	if " AND " in padded or " OR " in padded or " NOT " in padded:
+		return "boolean"
+	if "*" in query:
+		return "prefix"
+	return "terms"
+
+
+class SearchTelemetry:
+	"""
+	Process local aggregates of the sampled searches: a latency histogram per
+	engine and stage, query counts per engine and query shape, and the slowest
+	and most frequent zero result queries, bounded to TOP_QUERIES each.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._reset()
+		self._last_flush = time.monotonic()
+
+	def _reset(self):
+		# engine -> stage -> count per latency bucket, followed by the sum in nanoseconds
+		self.histograms: dict[str, dict[str, list[int]]] = {}
+		self.counters: Counter[tuple[str, str]] = Counter()
+		self.slow_queries: dict[str, float] = {}
+		self.zero_result_queries: Counter[str] = Counter()
+
+	def record(self, engine: str, query: str, trace: QueryTrace, total: int | None, cached: bool = False):
+		trace.stages["total"] = time.perf_counter_ns() - trace.start
+		weight = trace.weight
+
+		with self._lock:
+			counters = self.counters
+			counters[engine, get_query_shape(query)] += weight
+			if cached:
+				counters[engine, "cache_hits"] += weight
+			if total == 0:
+				counters[engine, "zero_results"] += weight
+				query = " ".join(query.split())
+				if query in self.zero_result_queries or len(self.zero_result_queries) < TOP_QUERIES:
+					self.zero_result_queries[query] += weight
+
+			if (histograms := self.histograms.get(engine)) is None:
+				histograms = self.histograms[engine] = {}
+			for stage, ns in trace.stages.items():
+				if (histogram := histograms.get(stage)) is None:
+					histogram = histograms[stage] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+				histogram[bisect_left(LATENCY_BUCKETS_NS, ns)] += weight
+				histogram[-1] += ns * weight
+
+			ms = trace.stages["total"] / 1_000_000
+			if ms >= SLOW_QUERY_MS and not cached:
+				key = f"{engine}|{' '.join(query.split())}"
+				if ms > self.slow_queries.get(key, 0):
+					self.slow_queries[key] = ms
+					if len(self.slow_queries) > TOP_QUERIES:
+						del self.slow_queries[min(self.slow_queries, key=self.slow_queries.get)]
+
+			if time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+				return
+
+			aggregates = (self.histograms, self.counters, self.slow_queries, self.zero_result_queries)
+			self._reset()
+			self._last_flush = time.monotonic()
+
+		self.flush(*aggregates)
+
+	def flush(self, histograms, counters, slow_queries, zero_result_queries):
+		redis = get_redis()
+		telemetry_key = make_key(TELEMETRY_KEY)
+		slow_key = make_key(SLOW_QUERIES_KEY)
+		zero_key = make_key(ZERO_RESULT_QUERIES_KEY)
+
+		# hash fields are engine|stage|bucket and engine|stage|sum_us for
+		# histograms, engine|queries|shape and engine|counter for counters
+		pipeline = redis.pipeline(transaction=False)
+		for engine, stages in histograms.items():
+			for stage, histogram in stages.items():
+				for bucket, count in enumerate(histogram[:-1]):
+					if count:
+						pipeline.hincrby(telemetry_key, f"{engine}|{stage}|{bucket}", count)
+				pipeline.hincrby(telemetry_key, f"{engine}|{stage}|sum_us", histogram[-1] // 1000)
+		for (engine, name), count in counters.items():
+			field = f"{engine}|{name}" if name in COUNTERS else f"{engine}|queries|{name}"
+			pipeline.hincrby(telemetry_key, field, count)
+		if slow_queries:
+			pipeline.zadd(slow_key, slow_queries, gt=True)
+			pipeline.zremrangebyrank(slow_key, 0, -TOP_QUERIES - 1)
+		for query, count in zero_result_queries.items():
+			pipeline.zincrby(zero_key, count, query)
+		if zero_result_queries:
+			# keep some headroom so new queries can work their way up
+			pipeline.zremrangebyrank(zero_key, 0, -TOP_QUERIES * 2 - 1)
+		pipeline.execute()
+
+
+_telemetry: dict[str, SearchTelemetry] = {}
+
+
+def get_telemetry() -> SearchTelemetry:
+	"""Aggregates of the current site, workers may serve several sites"""
+	if (telemetry := _telemetry.get(frappe.local.site)) is None:
+		telemetry = _telemetry.setdefault(frappe.local.site, SearchTelemetry())
+	return telemetry
+
+
+def get_latency_stats() -> list[dict[str, Any]]:
+	"""Query count, average and percentiles (upper bound of their bucket) per engine and stage"""
+	histograms = defaultdict(lambda: [0] * len(LATENCY_BUCKETS_MS))
+	sums = Counter()
+	counters = Counter()
+	for field, value in get_redis().hgetall(make_key(TELEMETRY_KEY)).items():
+		engine, name, *rest = field.decode().split("|")
+		if name in STAGES and rest[0] == "sum_us":
+			sums[engine, name] += int(value)
+		elif name in STAGES:
+			histograms[engine, name][int(rest[0])] += int(value)
+		else:
+			counters[engine, name] += int(value)
+
+	stats = []
+	for engine, stage in sorted(histograms, key=lambda key: (key[0], STAGES.index(key[1]))):
+		histogram = histograms[engine, stage]
+		count = sum(histogram)
+		stats.append(
+			{
+				"engine": engine,
+				"stage": stage,
+				"count": count,
+				"zero_results": counters[engine, "zero_results"] if stage == "total" else None,
+				"cache_hits": counters[engine, "cache_hits"] if stage == "total" else None,
+				"avg_ms": round(sums[engine, stage] / count / 1000, 3),
+				"p50_ms": _get_percentile(histogram, count, 0.5),
+				"p95_ms": _get_percentile(histogram, count, 0.95),
+				"p99_ms": _get_percentile(histogram, count, 0.99),
+			}
+		)
+	return stats
+
+
+def get_query_shapes() -> list[dict[str, Any]]:
+	shapes = []
+	for field, value in get_redis().hgetall(make_key(TELEMETRY_KEY)).items():
+		engine, name, *rest = field.decode().split("|")
+		if name == "queries":
+			shapes.append({"engine": engine, "shape": rest[0], "count": int(value)})
+	return sorted(shapes, key=lambda s: (s["engine"], -s["count"]))
+
+
+def get_slow_queries() -> list[dict[str, Any]]:
+	queries = get_redis().zrevrange(make_key(SLOW_QUERIES_KEY), 0, TOP_QUERIES - 1, withscores=True)
+	return [
+		{"engine": engine, "query": query, "ms": round(ms, 2)}
+		for engine, query, ms in ((*member.decode().split("|", 1), ms) for member, ms in queries)
+	]
+
+
+def get_zero_result_queries() -> list[dict[str, Any]]:
+	queries = get_redis().zrevrange(make_key(ZERO_RESULT_QUERIES_KEY), 0, TOP_QUERIES - 1, withscores=True)
+	return [{"query": query.decode(), "count": int(count)} for query, count in queries]
+
+
+def clear():
+	get_redis().delete(make_key(TELEMETRY_KEY), make_key(SLOW_QUERIES_KEY), make_key(ZERO_RESULT_QUERIES_KEY))
+
+
+def _get_percentile(histogram: list[int], count: int, percentile: float) -> float | None:
+	seen = 0
+	for bucket, bucket_count in enumerate(histogram):
+		seen += bucket_count
+		if seen >= count * percentile:
+			bound = LATENCY_BUCKETS_MS[bucket]
+			# the last bucket has no upper bound, report the bound of the one before it
+			return bound if bound != float("inf") else LATENCY_BUCKETS_MS[-2]
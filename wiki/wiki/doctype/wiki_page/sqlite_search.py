@@ -1,12 +1,79 @@
 from __future__ import annotations
 
 import contextlib
+import hashlib
+import os
 import re
+import resource
 import sqlite3
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+from itertools import islice
 from pathlib import Path
 from typing import Any
 
 import frappe
+from frappe.utils import now_datetime
+
+from wiki.utils import HEADING_TAG_PATTERN, HTML_TAG_PATTERN, get_heading_id, get_unique_heading_id
+from wiki.wiki.doctype.wiki_page.search import request_index_rebuild
+from wiki.wiki.doctype.wiki_page.search_telemetry import get_trace
+
+# Bump whenever the layout of the index db or its sections change, older dbs are rebuilt
+INDEX_VERSION = 10
+INDEX_STATS_KEY = "wiki_sqlite_search_index_stats"
+INDEX_BUILD_STATS_KEY = "wiki_sqlite_search_build_stats"
+
+# Full builds stream pages from the database in chunks, split and clean them
+# in a process pool and write each chunk with one executemany
+INDEX_BUILD_CHUNK_SIZE = 500
+INDEX_BUILD_WORKERS = min(4, os.cpu_count() or 1)
+
+MAX_IDLE_READERS = 8
+READER_MMAP_SIZE = 256 * 1024 * 1024
+READER_BUSY_TIMEOUT_MS = 2000
+
+DEFAULT_SEARCH_LIMIT = 20
+# number of best bm25 matches that are ordered by the match heuristics
+RERANK_CANDIDATES = 200
+
+# weights of the name, title, content, space and access columns of search_fts
+BM25_RANK = "bm25(search_fts, 0.0, 5.0, 2.0, 0.0, 0.0)"
+# token in the access column of sections of pages that guests can view
+GUEST_ACCESS_TOKEN = "guestaccess"
+# Typo tolerance: terms of the index are kept in a trigram table, when a query
+# has too few matches its unknown words are replaced with the closest terms
+FUZZY_SEARCH_ENABLED = sqlite3.sqlite_version_info >= (3, 34, 0)  # trigram tokenizer
+FUZZY_MIN_RESULTS = 3
+FUZZY_CANDIDATES = 50
+
+# Search as you type, completions of the word being typed and pages with titles starting with the query
+SUGGESTION_LIMIT = 8
+SUGGESTION_MIN_LENGTH = 2
+PAGE_SUGGESTION_LIMIT = 5
+
+TITLE_SNIPPET = "snippet(search_fts, 1, '<|', '|>', '...', 16)"
+CONTENT_SNIPPET = "snippet(search_fts, 2, '<|', '|>', '...', 16)"
+
+# ATX, setext and single line HTML headings, each one starts a new section of a page in the index
+HEADING_PATTERN = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$")
+SETEXT_UNDERLINE_PATTERN = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+SETEXT_TEXT_PATTERN = re.compile(r"^(?!\s*$| {0,3}(?:<|```|~~~))")
+CODE_FENCE_PATTERN = re.compile(r"^ {0,3}(```|~~~)")
+
+QUERY_SYNTAX_ERROR = "fts5: syntax error"
+# raised on pooled connections to an index file that was replaced or truncated underneath them
+REPLACED_INDEX_ERRORS = ("file is not a database", "database disk image is malformed", "no such table")
+
+INSERT_SECTION_QUERY = """
+	INSERT INTO search_index
+	(name, page, title, title_lower, page_title, content, route, space, access, modified)
+	VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
 
 def delete_db():
@@ -15,152 +82,470 @@ def delete_db():
 		Path(_get_index_path()).unlink()
 
 
-def search(query: str, space: str | None = None) -> list[dict[str, Any]]:
-	"""Search the index for the given query and return the results"""
+def search(
+	query: str,
+	space: str | None = None,
+	limit: int = DEFAULT_SEARCH_LIMIT,
+	offset: int = 0,
+	guest: bool = False,
+) -> dict[str, Any]:
+	"""
+	Search the index for the given query and return a page of results along
+	with the total number of matches. Guest searches only match pages that
+	allow guests.
+	"""
 
-	for _ in range(2):
-		try:
-			return _search(query, space)
-		except sqlite3.OperationalError:
-			delete_db()
-	return _search(query, space)
+	return _read_index(_run_search_query, {"docs": [], "total": 0}, query, space, limit, offset, guest)
 
 
-def _search(query: str, space: str | None = None) -> list[dict[str, Any]]:
-	index_path = _get_index_path()
-	if not index_path.exists():
-		build_index()
+def suggest(
+	query: str, space: str | None = None, limit: int = SUGGESTION_LIMIT, guest: bool = False
+) -> dict[str, Any]:
+	"""
+	Completions for a query that is being typed, cheap enough to run on every
+	keystroke. Returns the query completed with the most frequent indexed
+	terms starting with its last word, and pages or sections whose title
+	starts with the query.
+	"""
+	if len(query.strip()) < SUGGESTION_MIN_LENGTH:
+		return {"terms": [], "pages": []}
 
-	with contextlib.closing(sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)) as conn:
-		return _run_search_query(conn.cursor(), query, space)
+	return _read_index(_run_suggestion_query, {"terms": [], "pages": []}, query, space, limit, guest)
 
 
-def _run_search_query(cursor: sqlite3.Cursor, query: str, space: str | None = None) -> list[dict[str, Any]]:
-	_set_pragmas(cursor, is_read=True)
+def _read_index(run, empty, *args):
+	"""
+	Call run with a cursor of a pooled read connection to the index, followed
+	by args. Returns empty while the index is missing or of an older layout.
+	"""
+	try:
+		return _read_current_index(run, empty, *args)
+	except sqlite3.DatabaseError as e:
+		message = str(e)
+		if message.startswith(QUERY_SYNTAX_ERROR):
+			# boolean operators without their operands, eg. while the query is being typed
+			return empty
+		if not message.startswith(REPLACED_INDEX_ERRORS):
+			raise
+
+		# pooled connections may point to an index that was replaced in an
+		# unexpected way, retry once on fresh ones
+		_get_reader_pool(_get_index_path()).reset()
+		return _read_current_index(run, empty, *args)
+
+
+def _read_current_index(run, empty, *args):
+	index_path = _get_index_path()
+	if index_path.exists():
+		pool = _get_reader_pool(index_path)
+		with pool.connection() as conn:
+			if pool.version == INDEX_VERSION:
+				return run(conn.cursor(), *args)
 
-	search_query = """
-		SELECT
-			s.name,
-			snippet(search_fts, 1, '<|', '|>', '...', 16) as title,
-			snippet(search_fts, 2, '<|', '|>', '...', 16) as content,
-			s.route,
-			s.modified,
-			rank,
-			fts.title as title_raw,
-			fts.content as content_raw
-		FROM search_index s
-		JOIN search_fts fts ON s.name = fts.name
-		WHERE search_fts MATCH ?
+	# usually built or migrated by the rebuild after migrate, building it here
+	# would hold up the request and race with concurrent ones doing the same
+	request_index_rebuild()
+	return empty
+
+
+class _ReaderPool:
+	"""
+	Long lived read only connections to the index of a site. build_index swaps
+	in a new file, so connections are tagged with the inode they were opened on
+	and are replaced once the index path points to a different one. version is
+	the INDEX_VERSION of the file connections currently point to.
 	"""
 
+	def __init__(self, index_path: Path):
+		self.index_path = index_path
+		self.inode = None
+		self.version = None
+		self.idle: list[sqlite3.Connection] = []
+		self.lock = threading.Lock()
+
+	@contextlib.contextmanager
+	def connection(self):
+		inode = os.stat(self.index_path).st_ino
+
+		with self.lock:
+			if inode != self.inode:
+				self._close_idle()
+				self.inode = inode
+				self.version = None
+			conn = self.idle.pop() if self.idle else None
+
+		if not conn:
+			conn = self._connect()
+
+		if self.version is None:
+			self.version = conn.execute("PRAGMA user_version;").fetchone()[0]
+
+		try:
+			yield conn
+		except Exception:
+			conn.close()
+			raise
+
+		with self.lock:
+			if inode == self.inode and len(self.idle) < MAX_IDLE_READERS:
+				self.idle.append(conn)
+				conn = None
+
+		if conn:
+			conn.close()
+
+	def reset(self):
+		with self.lock:
+			self._close_idle()
+			self.inode = None
+			self.version = None
+
+	def _connect(self) -> sqlite3.Connection:
+		conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False)
+		# sqlite's lower() only folds ascii, match python's case folding used for ranking
+		conn.create_function("unicode_lower", 1, str.lower, deterministic=True)
+		conn.create_function("has_exact_match", 3, _has_exact_match, deterministic=True)
+		_set_pragmas(conn.cursor(), is_read=True)
+		return conn
+
+	def _close_idle(self):
+		for conn in self.idle:
+			conn.close()
+		self.idle = []
+
+
+_reader_pools: dict[Path, _ReaderPool] = {}
+_reader_pools_lock = threading.Lock()
+
+
+def _get_reader_pool(index_path: Path) -> _ReaderPool:
+	with _reader_pools_lock:
+		if index_path not in _reader_pools:
+			_reader_pools[index_path] = _ReaderPool(index_path)
+		return _reader_pools[index_path]
+
+
+def _run_search_query(
+	cursor: sqlite3.Cursor,
+	query: str,
+	space: str | None = None,
+	limit: int = DEFAULT_SEARCH_LIMIT,
+	offset: int = 0,
+	guest: bool = False,
+	fuzzy: bool = FUZZY_SEARCH_ENABLED,
+) -> dict[str, Any]:
+	trace = get_trace()
 	cleaned_query, has_boolean_ops = _clean_query(query)
-	params = [cleaned_query]
+	params = {"match": _get_match_expression(cleaned_query, space, guest)}
+	trace.mark("clean")
+
+	total = cursor.execute(
+		"SELECT count(*) FROM search_fts WHERE search_fts MATCH :match",
+		params,
+	).fetchone()[0]
+	trace.mark("match")
+
+	if fuzzy and total < FUZZY_MIN_RESULTS:
+		corrected_query = _correct_query(cursor, query)
+		trace.mark("fuzzy")
+		if corrected_query:
+			result = _run_search_query(cursor, corrected_query, space, limit, offset, guest, fuzzy=False)
+			if result["total"] > total:
+				result["corrected_query"] = corrected_query
+				return result
+
+	if offset >= total:
+		return {"docs": [], "total": total}
+
+	if has_boolean_ops:
+		cursor.execute(
+			f"""
+			SELECT rowid
+			FROM search_fts
+			WHERE search_fts MATCH :match
+			ORDER BY {BM25_RANK}
+			LIMIT :limit OFFSET :offset
+		""",
+			{**params, "limit": limit, "offset": offset},
+		)
+	else:
+		_execute_ranked_query(cursor, query, params, limit, offset)
+
+	rowids = [row[0] for row in cursor.fetchall()]
+	trace.mark("rerank")
+
+	docs = _get_result_docs(cursor, params["match"], rowids)
+	trace.mark("highlight")
+	return {"docs": docs, "total": total}
+
 
-	# Add space filter if provided
+def _get_match_expression(cleaned_query: str, space: str | None, guest: bool = False) -> str:
+	"""
+	Restrict the query to the title and content columns and, for scoped and
+	guest searches, to the postings of the space and access tokens so other
+	spaces and pages guests can't view are never ranked or snippeted
+	"""
+	match = f"{{title content}} : ({cleaned_query})"
 	if space:
-		search_query += " AND s.space = ?"
-		params.append(space)
-
-	search_query += " ORDER BY rank"
-
-	cursor.execute(search_query, params)
-	results = []
-
-	for row in cursor.fetchall():
-		results.append(
-			{
-				"name": row[0],
-				"title": row[1],
-				"content": row[2],
-				"route": row[3],
-				# Fields below are used for re-ranking
-				"modified": row[4],
-				"rank": row[5],
-				"is_title_match": "<|" in row[1],
-				"is_content_match": "<|" in row[2],
-				"title_raw": row[6],
-				"content_raw": row[7],
-			}
-		)
+		match = f'space : "{_get_space_token(space)}" AND {match}'
+	if guest:
+		match = f'access : "{GUEST_ACCESS_TOKEN}" AND {match}'
+	return match
 
-	return _rerank_and_clean(query, results, not has_boolean_ops)
 
+def _get_space_token(space: str | None) -> str:
+	"""Single token identifying a space route in the space column of search_fts"""
+	if not space:
+		return ""
+	return "space" + hashlib.blake2b(space.encode(), digest_size=8).hexdigest()
 
-def _rerank_and_clean(query: str, results: list[dict], check_match: bool):
-	if query.startswith('"') and query.endswith('"') and '"' not in query[1:-1]:
-		query = query[1:-1]
-
-	if check_match:
-		query_lower = query.lower()
-		match_case = any(w.isupper() for w in query)
-		results = sorted(
-			results,
-			key=lambda x: _rank_score(
-				x,
-				query,
-				query_lower,
-				match_case,
-			),
+
+def _execute_ranked_query(cursor: sqlite3.Cursor, query: str, params: dict, limit: int, offset: int):
+	"""
+	Order the best matches by bm25 with some sensible heuristics depending on
+	the nature of the match, from an exact title match down to a phrase match
+	in the content snippet. Heuristics are only applied to the top bm25 matches
+	so their cost, snippets included, doesn't grow with the number of matches.
+	"""
+	query = _strip_exact_match_quotes(query)
+
+	cursor.execute(
+		f"""
+		WITH candidates AS (
+			SELECT rowid, {BM25_RANK} AS score
+			FROM search_fts
+			WHERE search_fts MATCH :match
+			ORDER BY score
+			LIMIT :candidates
 		)
+		SELECT fts.rowid
+		FROM search_fts fts
+		JOIN candidates c ON c.rowid = fts.rowid
+		JOIN search_index s ON s.rowid = fts.rowid
+		WHERE search_fts MATCH :match
+		ORDER BY
+			CASE
+				WHEN s.title = :query THEN -10
+				WHEN s.title_lower = :query_lower THEN -9
+				WHEN instr(s.title, :query) THEN -8
+				WHEN instr(s.title_lower, :query_lower) THEN -7
+				WHEN has_exact_match({TITLE_SNIPPET}, :query, :match_case) THEN -6
+				WHEN s.content = :query THEN -5
+				WHEN unicode_lower(s.content) = :query_lower THEN -4
+				WHEN instr(s.content, :query) THEN -3
+				WHEN instr(unicode_lower(s.content), :query_lower) THEN -2
+				WHEN has_exact_match({CONTENT_SNIPPET}, :query, :match_case) THEN -1
+				ELSE 0
+			END,
+			c.score
+		LIMIT :limit OFFSET :offset
+	""",
+		{
+			**params,
+			"query": query,
+			"query_lower": query.lower(),
+			"match_case": any(w.isupper() for w in query),
+			"candidates": max(RERANK_CANDIDATES, offset + limit),
+			"limit": limit,
+			"offset": offset,
+		},
+	)
 
-	for r in results:
-		r["title"] = r["title"].replace("<|", "<b class='match'>").replace("|>", "</b>")
-		r["content"] = r["content"].replace("<|", "<b class='match'>").replace("|>", "</b>")
 
-		del r["rank"]
-		del r["modified"]
-		del r["is_title_match"]
-		del r["is_content_match"]
-		del r["title_raw"]
-		del r["content_raw"]
+def _run_suggestion_query(
+	cursor: sqlite3.Cursor,
+	query: str,
+	space: str | None = None,
+	limit: int = SUGGESTION_LIMIT,
+	guest: bool = False,
+) -> dict[str, Any]:
+	words = query.split()
+	# terms are indexed without case and diacritics, see the tokenizer of search_fts
+	prefix = _fold_diacritics(words[-1].lower())
+	terms = cursor.execute(
+		"""
+		SELECT term FROM search_terms
+		WHERE term >= :prefix AND term < :prefix || char(1114111) AND docs > 0
+		ORDER BY docs DESC
+		LIMIT :limit
+	""",
+		# search_terms counts documents of all pages, over fetch for the guest check below
+		{"prefix": prefix, "limit": limit * 3 if guest else limit},
+	).fetchall()
 
-	return results
+	if guest:
+		terms = [(term,) for (term,) in terms if _has_guest_match(cursor, term)][:limit]
 
+	filters = ""
+	if space:
+		filters += " AND space = :space"
+	if guest:
+		filters += " AND access = :access"
+	pages = cursor.execute(
+		f"""
+		SELECT title, route, page_title, name != page
+		FROM search_index
+		WHERE title_lower >= :query AND title_lower < :query || char(1114111) {filters}
+		ORDER BY length(title)
+		LIMIT :limit
+	""",
+		{
+			"query": " ".join(words).lower(),
+			"space": _get_space_token(space),
+			"access": GUEST_ACCESS_TOKEN,
+			"limit": PAGE_SUGGESTION_LIMIT,
+		},
+	).fetchall()
+
+	return {
+		"terms": [" ".join([*words[:-1], term]) for (term,) in terms],
+		"pages": [
+			{"title": f"{page_title} › {title}" if is_section else title, "route": route}
+			for title, route, page_title, is_section in pages
+		],
+	}
 
-def _rank_score(
-	item: dict,
-	query: str,
-	query_lower: str,
-	match_case: bool,
-) -> tuple[float, float]:
+
+def _has_guest_match(cursor: sqlite3.Cursor, term: str) -> bool:
+	"""Whether a term is in any page guests can view, so completions don't leak other pages"""
+	return bool(
+		cursor.execute(
+			"SELECT 1 FROM search_fts WHERE search_fts MATCH :match LIMIT 1",
+			{"match": _get_match_expression(f'"{term}"', None, guest=True)},
+		).fetchone()
+	)
+
+
+def _fold_diacritics(text: str) -> str:
+	return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _correct_query(cursor: sqlite3.Cursor, query: str) -> str | None:
 	"""
-	Uses some sensible heuristics to return a ranking score depending on the
-	nature of the match
+	Return the query with words that are not in the index replaced by the
+	closest indexed term, or None if nothing could be corrected. Queries with
+	exact matches or boolean operators are left alone.
 	"""
+	if '"' in query:
+		return None
 
-	# Title match heuristics
-	if query == item["title_raw"]:
-		return (-10, item["rank"])
+	words = query.split()
+	if any(word in {"AND", "OR", "NOT"} for word in words):
+		return None
 
-	if query_lower == item["title_raw"].lower():
-		return (-9, item["rank"])
+	corrected = False
+	for i, word in enumerate(words):
+		term = word.rstrip("*").lower()
+		if len(term) < 4 or _get_term_frequency(cursor, term):
+			continue
+
+		if closest_term := _get_closest_term(cursor, term):
+			words[i] = closest_term
+			corrected = True
+
+	return " ".join(words) if corrected else None
+
+
+def _get_closest_term(cursor: sqlite3.Cursor, term: str) -> str | None:
+	"""Closest indexed term within a few edits, more frequent terms win ties"""
+	trigrams = {term[i : i + 3] for i in range(len(term) - 2)}
+	trigram_query = " OR ".join('"{}"'.format(t.replace('"', '""')) for t in trigrams)
+
+	cursor.execute(
+		"""
+		SELECT term FROM search_terms_fts
+		WHERE search_terms_fts MATCH ?
+		ORDER BY rank
+		LIMIT ?
+	""",
+		(trigram_query, FUZZY_CANDIDATES),
+	)
 
-	if query in item["title_raw"]:
-		return (-8, item["rank"])
+	max_distance = 1 if len(term) < 8 else 2
+	best = None
+	for (candidate,) in cursor.fetchall():
+		distance = _edit_distance(term, candidate, max_distance)
+		if distance > max_distance:
+			continue
 
-	if query_lower in item["title_raw"].lower():
-		return (-7, item["rank"])
+		frequency = _get_term_frequency(cursor, candidate)
+		if frequency and (not best or (distance, -frequency) < best[:2]):
+			best = (distance, -frequency, candidate)
 
-	if _has_exact_match(item["title"], query, match_case):
-		return (-6, item["rank"])
+	return best[2] if best else None
 
-	# Content match heuristics
-	if query == item["content_raw"]:
-		return (-5, item["rank"])
 
-	if query_lower == item["content_raw"].lower():
-		return (-4, item["rank"])
+def _get_term_frequency(cursor: sqlite3.Cursor, term: str) -> int:
+	"""Number of documents containing the term"""
+	row = cursor.execute("SELECT docs FROM search_terms WHERE term = ?", (term,)).fetchone()
+	return row[0] if row else 0
 
-	if query in item["content_raw"]:
-		return (-3, item["rank"])
 
-	if query_lower in item["content_raw"].lower():
-		return (-2, item["rank"])
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+	"""Levenshtein distance, gives up once it's certain to exceed max_distance"""
+	if abs(len(a) - len(b)) > max_distance:
+		return max_distance + 1
 
-	if _has_exact_match(item["content"], query, match_case):
-		return (-1, item["rank"])
+	previous = list(range(len(b) + 1))
+	for i, char_a in enumerate(a, start=1):
+		current = [i]
+		for j, char_b in enumerate(b, start=1):
+			current.append(
+				min(
+					previous[j] + 1,
+					current[j - 1] + 1,
+					previous[j - 1] + (char_a != char_b),
+				)
+			)
+		if min(current) > max_distance:
+			return max_distance + 1
+		previous = current
 
-	return (0, item["rank"])
+	return previous[-1]
+
+
+def _get_result_docs(cursor: sqlite3.Cursor, match: str, rowids: list[int]) -> list[dict[str, Any]]:
+	"""Build the results for a page of matches, in the given order"""
+	if not rowids:
+		return []
+
+	placeholders = ", ".join("?" * len(rowids))
+	cursor.execute(
+		f"""
+		SELECT
+			fts.rowid,
+			s.page,
+			{TITLE_SNIPPET} as title,
+			{CONTENT_SNIPPET} as content,
+			s.route,
+			s.page_title,
+			s.name != s.page as is_section
+		FROM search_fts fts
+		JOIN search_index s ON s.rowid = fts.rowid
+		WHERE search_fts MATCH ? AND fts.rowid IN ({placeholders})
+	""",
+		[match, *rowids],
+	)
+
+	docs = {}
+	for rowid, page, title, content, route, page_title, is_section in cursor.fetchall():
+		title = _highlight(title)
+		if is_section:
+			title = f"{page_title} › {title}"
+
+		docs[rowid] = {"name": page, "title": title, "content": _highlight(content), "route": route}
+
+	return [docs[rowid] for rowid in rowids if rowid in docs]
+
+
+def _highlight(snippet: str) -> str:
+	return snippet.replace("<|", "<b class='match'>").replace("|>", "</b>")
+
+
+def _strip_exact_match_quotes(query: str) -> str:
+	if query.startswith('"') and query.endswith('"') and '"' not in query[1:-1]:
+		return query[1:-1]
+	return query
 
 
 def _has_exact_match(snippet: str, query: str, match_case: bool) -> bool:
@@ -251,54 +636,322 @@ def _clean_query(query: str) -> tuple[str, bool]:
 	return f"{query}*", flags["has_boolean_ops"]
 
 
-def build_index():
-	"""Create new db with search index and replace existing one"""
+def build_index(space: str | None = None):
+	"""
+	Create new db with search index and replace existing one. If a space route
+	is given only the pages of that space are re-indexed, in place.
+	"""
+	if space:
+		return _rebuild_space(space)
+
+	_replace_index(_stream_index_items())
+
+
+def _replace_index(docs):
+	"""Write the given documents to a temp db and swap it in as the index"""
 	temp_path = _get_index_path(is_temp=True)
 	if temp_path.exists():
 		temp_path.unlink()
 
-	with contextlib.closing(sqlite3.connect(temp_path)) as conn:
+	start = time.perf_counter()
+	pages = _write_index(temp_path, docs)
+	_record_build_stats(pages, time.perf_counter() - start)
+
+	actual = _get_index_path()
+
+	# a journal left behind by a crashed update must not be replayed on the new db
+	with contextlib.suppress(FileNotFoundError):
+		Path(f"{actual}-journal").unlink()
+
+	# atomic, searches keep using the old file until they notice the swap
+	temp_path.replace(actual)
+
+
+def _write_index(path: Path, docs, workers: int = INDEX_BUILD_WORKERS) -> int:
+	"""Create a new index db at the given path with the given documents, returns the number of pages"""
+	pages = 0
+	with contextlib.closing(sqlite3.connect(path)) as conn:
 		cursor = conn.cursor()
 		_set_pragmas(cursor, is_read=False)
+		# a failed build only leaves a temp db behind that is discarded
+		cursor.execute("PRAGMA synchronous = OFF;")
+		_create_tables(cursor)
+
+		# one transaction for all rows, committed once the index is complete
+		for rows, count in _get_section_rows_in_chunks(docs, workers):
+			cursor.executemany(INSERT_SECTION_QUERY, rows)
+			pages += count
+
+		# indexing all rows at once is faster than one by one
+		cursor.execute("INSERT INTO search_fts (search_fts) VALUES ('rebuild')")
+		_update_terms(cursor)
+		conn.commit()
 
+	return pages
+
+
+def _get_section_rows_in_chunks(docs, workers: int):
+	"""
+	Yield the search_index rows of chunks of docs along with the number of
+	pages in the chunk. Chunks are processed in a pool of worker processes
+	and only a few are in flight at once, so the corpus is never held in
+	memory as a whole.
+	"""
+	docs = iter(docs)
+	chunks = iter(lambda: list(islice(docs, INDEX_BUILD_CHUNK_SIZE)), [])
+	if workers <= 1:
+		for chunk in chunks:
+			yield _get_section_rows(chunk), len(chunk)
+		return
+
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		pending = deque()
+		for chunk in chunks:
+			pending.append((pool.submit(_get_section_rows, chunk), len(chunk)))
+			if len(pending) > workers * 2:
+				future, count = pending.popleft()
+				yield future.result(), count
+
+		while pending:
+			future, count = pending.popleft()
+			yield future.result(), count
+
+
+def _rebuild_space(space: str):
+	index_path = _get_index_path()
+	if not index_path.exists() or _get_index_version(index_path) != INDEX_VERSION:
+		return build_index()
+
+	with contextlib.closing(sqlite3.connect(index_path)) as conn:
+		indexed = {
+			name
+			for (name,) in conn.execute(
+				"SELECT DISTINCT page FROM search_index WHERE space = ?", (_get_space_token(space),)
+			)
+		}
+
+	spaces = _get_spaces()
+	in_space = _get_sidebar_spaces(
+		spaces, {"parent": ("in", [name for name, route in spaces.items() if route == space])}
+	)
+
+	# pages that left the space are re-indexed too, under their new space or none
+	update_index(indexed | set(in_space))
+
+
+def update_index(names: list[str]):
+	"""
+	Sync the index rows of the given Wiki Pages with the database. Pages that
+	were deleted, unpublished or are otherwise missing are removed from the
+	index, the rest are re-indexed. Falls back to a full rebuild if there is no
+	usable index yet.
+	"""
+	index_path = _get_index_path()
+	if not index_path.exists() or _get_index_version(index_path) != INDEX_VERSION:
+		return build_index()
+
+	names = set(names)
+	if not names:
+		return
+
+	docs = {doc.name: doc for doc in _get_index_items(names)}
+	timings = []
+
+	with contextlib.closing(sqlite3.connect(index_path)) as conn:
+		cursor = conn.cursor()
+		_set_pragmas(cursor, is_read=False)
+		_create_changed_terms_table(cursor)
+
+		for name in names:
+			start = time.perf_counter()
+			# terms of the rows before and after the update, only these need a sync
+			_add_changed_terms(name, cursor)
+			_remove_from_index(name, cursor)
+			if doc := docs.get(name):
+				_add_to_index(doc, cursor)
+				_add_changed_terms(name, cursor)
+			timings.append(time.perf_counter() - start)
+
+		_update_terms(cursor, changed_only=True)
+		conn.commit()
+
+	_record_update_stats(timings)
+
+
+def get_index_stats() -> dict[str, Any]:
+	"""Latency metrics of the last incremental index update"""
+	return frappe.cache().get_value(INDEX_STATS_KEY) or {}
+
+
+def get_build_stats() -> dict[str, Any]:
+	"""Throughput and memory usage of the last full index build"""
+	return frappe.cache().get_value(INDEX_BUILD_STATS_KEY) or {}
+
+
+def _record_build_stats(pages: int, seconds: float):
+	# ru_maxrss is in kilobytes on linux, and the peak over the life of the process
+	stats = {
+		"pages": pages,
+		"seconds": round(seconds, 3),
+		"pages_per_second": round(pages / seconds, 1) if seconds else None,
+		"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+		"workers_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+		"built_at": now_datetime().isoformat(),
+	}
+	frappe.cache().set_value(INDEX_BUILD_STATS_KEY, stats)
+
+	if not hasattr(frappe.local, "request"):
+		print(
+			f"Indexed {pages} pages in {stats['seconds']}s ({stats['pages_per_second']} pages/s),"
+			f" peak RSS {stats['peak_rss_mb']}MB, workers {stats['workers_peak_rss_mb']}MB"
+		)
+
+
+def _record_update_stats(timings: list[float]):
+	if not timings:
+		return
+
+	timings_ms = [t * 1000 for t in timings]
+	frappe.cache().set_value(
+		INDEX_STATS_KEY,
+		{
+			"docs": len(timings_ms),
+			"total_ms": round(sum(timings_ms), 3),
+			"avg_ms": round(sum(timings_ms) / len(timings_ms), 3),
+			"max_ms": round(max(timings_ms), 3),
+			"updated_at": now_datetime().isoformat(),
+		},
+	)
+
+
+def _create_tables(cursor: sqlite3.Cursor):
+	# Every row is a section of a page, see _get_sections. content is the
+	# cleaned text that is searched and snippeted, space is a single token per
+	# space route so scoped searches are filtered inside the index, see
+	# _get_space_token. access is GUEST_ACCESS_TOKEN for pages guests can view.
+	cursor.execute("""
+		CREATE TABLE search_index (
+			name TEXT PRIMARY KEY,
+			page TEXT,
+			title TEXT,
+			title_lower TEXT,
+			page_title TEXT,
+			content TEXT,
+			route TEXT,
+			space TEXT,
+			access TEXT,
+			modified TEXT
+		)
+	""")
+	cursor.execute("CREATE INDEX search_index_page ON search_index (page)")
+	cursor.execute("CREATE INDEX search_index_space ON search_index (space)")
+	cursor.execute("CREATE INDEX search_index_title ON search_index (title_lower)")
+	# External content table, search_fts only stores the inverted index and
+	# reads columns from search_index by rowid. Rows have to be removed from
+	# it with their indexed values, see _remove_from_index.
+	cursor.execute("""
+		CREATE VIRTUAL TABLE search_fts USING fts5(
+			name UNINDEXED,
+			title,
+			content,
+			space,
+			access,
+			content='search_index',
+			tokenize="unicode61 remove_diacritics 2 tokenchars '-_'",
+		)
+	""")
+	cursor.execute("CREATE VIRTUAL TABLE search_vocab USING fts5vocab(search_fts, 'col')")
+	# Terms with the number of documents containing them, for suggestions and
+	# typo tolerance. Terms are only ever added, ones that are no longer in
+	# search_vocab are kept with 0 documents.
+	cursor.execute("CREATE TABLE search_terms (id INTEGER PRIMARY KEY, term TEXT UNIQUE, docs INTEGER)")
+	if FUZZY_SEARCH_ENABLED:
 		cursor.execute("""
-			CREATE TABLE search_index (
-				name TEXT PRIMARY KEY,
-				title TEXT,
-				content TEXT,
-				route TEXT,
-				space TEXT,
-				modified TEXT
+			CREATE VIRTUAL TABLE search_terms_fts USING fts5(
+				term,
+				content='search_terms',
+				content_rowid='id',
+				tokenize='trigram'
 			)
 		""")
+
+	cursor.execute(f"PRAGMA user_version = {INDEX_VERSION};")
+
+
+def _create_changed_terms_table(cursor: sqlite3.Cursor):
+	"""Scratch table of the rows changed by an update, tokenized the same way as search_fts"""
+	cursor.execute("""
+		CREATE VIRTUAL TABLE temp.changed_terms USING fts5(
+			title,
+			content,
+			tokenize="unicode61 remove_diacritics 2 tokenchars '-_'",
+		)
+	""")
+	cursor.execute("CREATE VIRTUAL TABLE temp.changed_vocab USING fts5vocab(temp, changed_terms, 'row')")
+
+
+def _add_changed_terms(name: str, cursor: sqlite3.Cursor):
+	cursor.execute(
+		"""
+		INSERT INTO temp.changed_terms (title, content)
+		SELECT title, content FROM search_index WHERE page = ?
+	""",
+		(name,),
+	)
+
+
+def _update_terms(cursor: sqlite3.Cursor, changed_only: bool = False):
+	"""
+	Sync search_terms with the vocabulary of the index and add new terms to
+	the trigram table. Full builds sync the whole vocabulary, incremental
+	updates only the terms of the rows they changed, looked up one by one in
+	search_vocab so an update does not cost more with a larger vocabulary.
+	Terms no longer in any row are kept with 0 documents.
+	"""
+	last_id = cursor.execute("SELECT coalesce(max(id), 0) FROM search_terms").fetchone()[0]
+	if changed_only:
 		cursor.execute("""
-			CREATE VIRTUAL TABLE search_fts USING fts5(
-				name UNINDEXED,
-				title,
-				content,
-				tokenize="unicode61 remove_diacritics 2 tokenchars '-_'",
+			INSERT INTO search_terms (term, docs)
+			SELECT term, (
+				SELECT coalesce(max(doc), 0) FROM search_vocab
+				WHERE search_vocab.term = changed_vocab.term AND col IN ('title', 'content')
 			)
+			FROM temp.changed_vocab WHERE true
+			ON CONFLICT (term) DO UPDATE SET docs = excluded.docs
+		""")
+	else:
+		cursor.execute("""
+			INSERT INTO search_terms (term, docs)
+			SELECT term, max(doc) FROM search_vocab WHERE col IN ('title', 'content') GROUP BY term
+			ON CONFLICT (term) DO UPDATE SET docs = excluded.docs
 		""")
 
-		for doc in _get_index_items():
-			_add_to_index(doc, cursor)
+	if not FUZZY_SEARCH_ENABLED:
+		return
 
-		conn.commit()
+	cursor.execute(
+		"INSERT INTO search_terms_fts (rowid, term) SELECT id, term FROM search_terms WHERE id > ?",
+		(last_id,),
+	)
 
-	actual = _get_index_path()
-	if actual.exists():
-		actual.unlink()
 
-	temp_path.rename(actual)
+def _get_index_version(index_path: Path) -> int:
+	with contextlib.closing(sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)) as conn:
+		return conn.execute("PRAGMA user_version;").fetchone()[0]
 
 
 def _set_pragmas(cursor: sqlite3.Cursor, is_read: bool):
-	cursor.execute("PRAGMA journal_mode = WAL;")
-	cursor.execute("PRAGMA synchronous = NORMAL;")
 	cursor.execute("PRAGMA cache_size = -8192;")  # 8MB cache
 	cursor.execute("PRAGMA temp_store = MEMORY;")
 	if is_read:
 		cursor.execute("PRAGMA query_only = 1;")
+		cursor.execute(f"PRAGMA mmap_size = {READER_MMAP_SIZE};")
+		cursor.execute(f"PRAGMA busy_timeout = {READER_BUSY_TIMEOUT_MS};")
+	else:
+		# Rollback journal instead of WAL, a WAL file kept open by pooled
+		# readers would otherwise be replayed on the db swapped in by build_index
+		cursor.execute("PRAGMA journal_mode = DELETE;")
+		cursor.execute("PRAGMA synchronous = NORMAL;")
 
 
 def _get_index_path(is_temp: bool = False):
@@ -334,42 +987,151 @@ def _clean_content(text: str) -> str:
 
 
 def _add_to_index(doc: dict[str, Any], cursor: sqlite3.Cursor):
-	"""Add a document to the search index"""
+	"""Add a page to the search index"""
+	cursor.executemany(INSERT_SECTION_QUERY, _get_section_rows([doc]))
 
-	# Insert into main table
 	cursor.execute(
 		"""
-		INSERT OR REPLACE INTO search_index
-		(name, title, content, route, space, modified)
-		VALUES (?, ?, ?, ?, ?, ?)
+		INSERT INTO search_fts
+		(rowid, name, title, content, space, access)
+		SELECT rowid, name, title, content, space, access FROM search_index WHERE page = ?
 	""",
-		(
-			doc["name"],
-			doc["title"],
-			doc["content"],  # Store original content
-			doc["route"],
-			doc["space"],
-			doc["modified"],
-		),
+		(doc["name"],),
 	)
 
-	# Insert into FTS table
-	cursor.execute(
+
+def _get_section_rows(docs: list[dict[str, Any]]) -> list[tuple]:
+	"""
+	search_index rows of the sections of the given pages, content is stored
+	once, cleaned, in search_index. Runs in the worker processes of full builds.
+	"""
+	rows = []
+	for doc in docs:
+		space = _get_space_token(doc["space"])
+		access = GUEST_ACCESS_TOKEN if doc.get("allow_guest") else ""
+		for name, title, anchor, content in _get_sections(doc):
+			rows.append(
+				(
+					name,
+					doc["name"],
+					title,
+					title.lower(),  # Used for case insensitive title matches
+					doc["title"],
+					_clean_content(content),  # Use cleaned content for search
+					f"{doc['route']}#{anchor}" if anchor else doc["route"],
+					space,
+					access,
+					doc["modified"],
+				)
+			)
+	return rows
+
+
+def _get_sections(doc: dict[str, Any]):
+	"""
+	Split a page into sections at its headings, each section is searched as a
+	document of its own and links to the heading it starts with. The text
+	before the first heading is the first section and is titled and named
+	after the page. Anchors are numbered like compile_html numbers the
+	headings of the rendered page, HTML headings spanning several lines are
+	not split on and shift the numbers of later headings with the same text.
+
+	Yields (name, title, anchor, content) for each section.
+	"""
+	name, title, anchor = doc["name"], doc["title"], None
+	# the page title takes the first anchor, headings with the same text get numbered ones
+	seen_anchors = {get_heading_id(title or "")}
+	lines = []
+	sections = 0
+	in_code_block = False
+
+	for line in (doc["content"] or "").splitlines():
+		if CODE_FENCE_PATTERN.match(line):
+			in_code_block = not in_code_block
+
+		heading_title = None if in_code_block else _get_heading_title(line, lines)
+		if heading_title is None:
+			lines.append(line)
+			continue
+
+		if not HEADING_PATTERN.match(line) and SETEXT_UNDERLINE_PATTERN.match(line):
+			# the text of a setext heading is the line above its underline
+			lines.pop()
+		yield name, title, anchor, "\n".join(lines)
+
+		# same text and anchor as the heading in the rendered page
+		title = heading_title
+		anchor = get_unique_heading_id(title, seen_anchors)
+		sections += 1
+		name = f"{doc['name']}#{sections}"
+		lines = []
+
+	yield name, title, anchor, "\n".join(lines)
+
+
+def _get_heading_title(line: str, lines: list[str]) -> str | None:
+	"""Text of the heading on the line, lines are the ones above it in the section"""
+	if heading := HEADING_PATTERN.match(line):
+		return _clean_content(heading.group(2))
+
+	if (heading := HEADING_TAG_PATTERN.fullmatch(line.strip())) and "\n" not in heading.group(3):
+		return unescape(HTML_TAG_PATTERN.sub("", heading.group(3))).strip()
+
+	# markdown2 makes the line right above the underline the heading, even within a paragraph
+	if SETEXT_UNDERLINE_PATTERN.match(line) and lines and SETEXT_TEXT_PATTERN.match(lines[-1]):
+		return _clean_content(lines[-1])
+
+
+def _remove_from_index(name: str, cursor: sqlite3.Cursor):
+	"""Remove the sections of a page from the search index, if present"""
+	rows = cursor.execute(
+		"SELECT rowid, name, title, content, space, access FROM search_index WHERE page = ?", (name,)
+	).fetchall()
+	if not rows:
+		return
+
+	# external content, fts5 needs the indexed values to remove their postings
+	cursor.executemany(
 		"""
-		INSERT OR REPLACE INTO search_fts
-		(name, title, content)
-		VALUES (?, ?, ?)
+		INSERT INTO search_fts
+		(search_fts, rowid, name, title, content, space, access)
+		VALUES ('delete', ?, ?, ?, ?, ?, ?)
 	""",
-		(
-			doc["name"],
-			doc["title"],
-			_clean_content(doc["content"]),  # Use cleaned content for search
-		),
+		rows,
+	)
+	cursor.execute("DELETE FROM search_index WHERE page = ?", (name,))
+
+
+def _stream_index_items():
+	"""
+	Yield all published pages with an unbuffered cursor, so pages are fetched
+	from the database as the build consumes them
+	"""
+	sidebar_items = _get_sidebar_spaces(_get_spaces())
+
+	WikiPage = frappe.qb.DocType("Wiki Page")
+	query = (
+		frappe.qb.from_(WikiPage)
+		.select(
+			WikiPage.name,
+			WikiPage.title,
+			WikiPage.content,
+			WikiPage.route,
+			WikiPage.modified,
+			WikiPage.allow_guest,
+		)
+		.where(WikiPage.published == 1)
 	)
 
+	with frappe.db.unbuffered_cursor():
+		for page in query.run(as_dict=True, as_iterator=True):
+			page["space"] = sidebar_items.get(page.name, None)
+			page["modified"] = page["modified"].isoformat()
+			yield page
+
 
-def _get_index_items():
-	spaces = {
+def _get_spaces() -> dict[str, str]:
+	return {
 		i.name: i.route
 		for i in frappe.get_all(
 			"Wiki Space",
@@ -377,14 +1139,35 @@ def _get_index_items():
 		)
 	}
 
-	sidebar_items = {
+
+def _get_sidebar_spaces(spaces: dict[str, str], filters: dict | None = None) -> dict[str, str]:
+	"""Space route of each page in the sidebars matching the filters"""
+	return {
 		i.wiki_page: spaces[i.parent]
 		for i in frappe.get_all(
 			"Wiki Group Item",
 			fields=["parent", "wiki_page"],
+			filters=filters or {},
 		)
 	}
 
+
+def _get_index_items(names: set[str] | None = None, space: str | None = None):
+	spaces = _get_spaces()
+
+	page_filters = {"published": 1}
+	sidebar_filters = {}
+	if names is not None:
+		page_filters["name"] = ("in", list(names))
+		sidebar_filters["wiki_page"] = ("in", list(names))
+	if space is not None:
+		sidebar_filters["parent"] = ("in", [name for name, route in spaces.items() if route == space])
+
+	sidebar_items = _get_sidebar_spaces(spaces, sidebar_filters)
+
+	if space is not None:
+		page_filters["name"] = ("in", list(sidebar_items))
+
 	pages = frappe.get_all(
 		"Wiki Page",
 		fields=[
@@ -393,8 +1176,9 @@ def _get_index_items():
 			"content",
 			"route",
 			"modified",
+			"allow_guest",
 		],
-		filters={"published": 1},
+		filters=page_filters,
 	)
 
 	for i in pages:
@@ -0,0 +1,176 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+import time
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from wiki.utils import get_redis, make_key
+from wiki.wiki.doctype.wiki_page import search
+
+INDEXER_KEYS = (
+	search.INDEX_QUEUE_KEY,
+	search.INDEX_REBUILD_KEY,
+	search.INDEX_LAST_CHANGE_KEY,
+	search.INDEX_LEASE_KEY,
+)
+
+
+class FakeClock:
+	def __init__(self, now):
+		self.now = now
+		self.sleeps = []
+
+	def time(self):
+		return self.now
+
+	def sleep(self, seconds):
+		self.sleeps.append(seconds)
+		self.now += seconds
+
+
+@patch.object(search, "schedule_index_update")
+class TestIndexQueue(FrappeTestCase):
+	def setUp(self):
+		self.redis = get_redis()
+		self.clear_keys()
+
+	def tearDown(self):
+		self.clear_keys()
+
+	def clear_keys(self):
+		self.redis.delete(*(make_key(key) for key in INDEXER_KEYS))
+		frappe.cache().delete_value(search.INDEX_STATUS_KEY)
+
+	def get_queue(self):
+		return {name.decode() for name in self.redis.smembers(make_key(search.INDEX_QUEUE_KEY))}
+
+	def test_queue_is_drained_in_batches(self, schedule_index_update):
+		search._queue_pages(["page-1", "page-2", "page-3"])
+		schedule_index_update.assert_called_once()
+		self.assertEqual(set(search.get_queued_pages()), {"page-1", "page-2", "page-3"})
+
+		batches = []
+		with (
+			patch.object(search, "INDEX_BATCH_SIZE", 2),
+			patch.object(search, "_wait_for_quiet_period"),
+			patch.object(search, "update_index", side_effect=lambda names: batches.append(set(names))),
+		):
+			search.process_index_queue()
+
+		self.assertEqual([len(batch) for batch in batches], [2, 1])
+		self.assertEqual(set().union(*batches), {"page-1", "page-2", "page-3"})
+		self.assertFalse(self.get_queue())
+		self.assertFalse(self.redis.exists(make_key(search.INDEX_LEASE_KEY)))
+		self.assertEqual(frappe.cache().get_value(search.INDEX_STATUS_KEY).pages, 3)
+
+	def test_failed_update_keeps_pages_queued(self, schedule_index_update):
+		search._queue_pages(["page-1", "page-2"])
+
+		with (
+			patch.object(search, "_wait_for_quiet_period"),
+			patch.object(search, "update_index", side_effect=Exception),
+			self.assertRaises(Exception),
+		):
+			search.process_index_queue()
+
+		self.assertEqual(self.get_queue(), {"page-1", "page-2"})
+
+	def test_failed_rebuild_is_retried(self, schedule_index_update):
+		search._queue_pages(["page-1"])
+		search.queue_index_rebuild()
+		self.assertTrue(search._acquire_lease("token"))
+
+		with patch.object(search, "build_index", side_effect=Exception), self.assertRaises(Exception):
+			search._drain_index_queue("token", frappe._dict(pages=0, full_rebuild=False))
+
+		self.assertTrue(self.redis.exists(make_key(search.INDEX_REBUILD_KEY)))
+		self.assertEqual(self.get_queue(), {"page-1"})
+
+	def test_rebuild_keeps_pages_queued_while_it_runs(self, schedule_index_update):
+		search.queue_index_rebuild()
+		status = frappe._dict(pages=0, full_rebuild=False)
+		self.assertTrue(search._acquire_lease("token"))
+
+		with (
+			patch.object(search, "build_index", side_effect=lambda: search._queue_pages(["page-1"])),
+			patch.object(search, "update_index") as update_index,
+		):
+			search._drain_index_queue("token", status)
+
+		self.assertTrue(status.full_rebuild)
+		update_index.assert_called_once_with(["page-1"])
+
+	def test_rebuild_requested_by_searches(self, schedule_index_update):
+		rebuild_key = make_key(search.INDEX_REBUILD_KEY)
+
+		# a running indexer may be rebuilding the index already
+		self.assertTrue(search._acquire_lease("token"))
+		search.request_index_rebuild()
+		self.assertFalse(self.redis.exists(rebuild_key))
+		search._release_lease("token")
+
+		search.request_index_rebuild()
+		search.request_index_rebuild()
+		self.assertTrue(self.redis.exists(rebuild_key))
+		schedule_index_update.assert_called_once()
+
+	def test_lease(self, schedule_index_update):
+		self.assertTrue(search._acquire_lease("first"))
+		self.assertFalse(search._acquire_lease("second"))
+
+		# only the holder extends or releases the lease
+		self.assertFalse(search._extend_lease("second"))
+		search._release_lease("second")
+		self.assertTrue(self.redis.exists(make_key(search.INDEX_LEASE_KEY)))
+		self.assertTrue(search._extend_lease("first"))
+
+		search._release_lease("first")
+		self.assertTrue(search._acquire_lease("second"))
+
+	def test_lost_lease_stops_draining(self, schedule_index_update):
+		search._queue_pages(["page-1"])
+		# the lease of this indexer expired and was taken over by another one
+		self.assertTrue(search._acquire_lease("other"))
+
+		with patch.object(search, "update_index") as update_index:
+			search._drain_index_queue("token", frappe._dict(pages=0, full_rebuild=False))
+
+		update_index.assert_not_called()
+		self.assertEqual(self.get_queue(), {"page-1"})
+		self.assertFalse(search._extend_lease("token"))
+
+	def test_lease_is_kept_during_long_steps(self, schedule_index_update):
+		lease_key = make_key(search.INDEX_LEASE_KEY)
+		self.assertTrue(search._acquire_lease("token"))
+		self.redis.expire(lease_key, 5)
+
+		with patch.object(search, "INDEX_LEASE_RENEW_SECONDS", 0.05), search._keep_lease("token"):
+			time.sleep(0.2)
+
+		self.assertGreater(self.redis.ttl(lease_key), 5)
+
+	def test_debounce(self, schedule_index_update):
+		clock = FakeClock(1000.0)
+		last_change_key = make_key(search.INDEX_LAST_CHANGE_KEY)
+
+		with patch.object(search, "time", clock):
+			# waits for the quiet period after the last change
+			self.redis.set(last_change_key, clock.now - 2)
+			search._wait_for_quiet_period()
+			self.assertEqual(sum(clock.sleeps), search.INDEX_DEBOUNCE_SECONDS - 2)
+
+			# changes that keep coming in are only waited on up to the maximum
+			clock.sleeps.clear()
+			original_sleep = clock.sleep
+
+			def sleep_and_change(seconds):
+				original_sleep(seconds)
+				self.redis.set(last_change_key, clock.now)
+
+			clock.sleep = sleep_and_change
+			self.redis.set(last_change_key, clock.now)
+			search._wait_for_quiet_period()
+			self.assertEqual(sum(clock.sleeps), search.INDEX_MAX_DEBOUNCE_SECONDS)
@@ -0,0 +1,58 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from wiki.wiki.doctype.wiki_page import search, search_cache
+from wiki.wiki.doctype.wiki_page.search_cache import SearchResultCache
+
+
+class TestSearchResultCache(FrappeTestCase):
+	def test_hits(self):
+		cache = SearchResultCache(maxsize=2, ttl=60)
+		self.assertIsNone(cache.get(("marimba",)))
+
+		cache.set(("marimba",), {"docs": [], "total": 0})
+		self.assertEqual(cache.get(("marimba",)), {"docs": [], "total": 0})
+		self.assertEqual(cache.stats()["hits"], 1)
+		self.assertEqual(cache.stats()["misses"], 1)
+		self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+	def test_expiry(self):
+		cache = SearchResultCache(maxsize=2, ttl=60)
+		with patch.object(search_cache, "time") as time:
+			time.monotonic.return_value = 1000
+			cache.set(("marimba",), {"docs": []})
+			time.monotonic.return_value = 1059
+			self.assertIsNotNone(cache.get(("marimba",)))
+			time.monotonic.return_value = 1060
+			self.assertIsNone(cache.get(("marimba",)))
+
+	def test_eviction(self):
+		cache = SearchResultCache(maxsize=2, ttl=60)
+		cache.set(("marimba",), 1)
+		cache.set(("xylophone",), 2)
+
+		# the least recently used entry is evicted
+		cache.get(("marimba",))
+		cache.set(("tuning",), 3)
+		self.assertEqual(cache.stats()["size"], 2)
+		self.assertIsNone(cache.get(("xylophone",)))
+		self.assertEqual(cache.get(("marimba",)), 1)
+		self.assertEqual(cache.get(("tuning",)), 3)
+
+	@patch.object(search, "_search_cache", SearchResultCache(maxsize=10, ttl=60))
+	def test_index_change_invalidates_results(self):
+		with patch.object(search, "sqlite_search", return_value={"docs": [], "total": 0}) as sqlite_search:
+			args = ("marimba", None, 20, 0, False, "sqlite_fts")
+			self.assertFalse(search._search(*args)[1])
+			self.assertTrue(search._search(*args)[1])
+
+			# results of the previous generation of the index aren't hit anymore
+			search.bump_index_generation()
+			self.assertFalse(search._search(*args)[1])
+			self.assertTrue(search._search(*args)[1])
+
+		self.assertEqual(sqlite_search.call_count, 2)
@@ -0,0 +1,105 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from wiki.wiki.doctype.wiki_page import search_telemetry
+from wiki.wiki.doctype.wiki_page.search_telemetry import QueryTrace, SearchTelemetry
+
+MS = 1_000_000
+
+
+def make_trace(weight=1, total_ms=0, **stages_ms):
+	trace = QueryTrace(weight)
+	# the total is taken when the search is recorded
+	trace.start -= int(total_ms * MS)
+	trace.stages = {stage: int(ms * MS) for stage, ms in stages_ms.items()}
+	return trace
+
+
+class TestSearchTelemetry(FrappeTestCase):
+	def setUp(self):
+		search_telemetry.clear()
+		self.telemetry = SearchTelemetry()
+		self.telemetry._last_flush = float("inf")
+
+	def tearDown(self):
+		search_telemetry.clear()
+
+	def flush(self):
+		telemetry = self.telemetry
+		telemetry.flush(
+			telemetry.histograms, telemetry.counters, telemetry.slow_queries, telemetry.zero_result_queries
+		)
+
+	def test_histogram_buckets(self):
+		for ms in (0.05, 0.1, 1, 1.01, 10_000):
+			self.telemetry.record("sqlite_fts", "marimba", make_trace(match=ms), 1)
+
+		histogram = self.telemetry.histograms["sqlite_fts"]["match"]
+		buckets = search_telemetry.LATENCY_BUCKETS_MS
+		# durations fall in the first bucket they don't exceed, the last one is unbounded
+		self.assertEqual(histogram[buckets.index(0.1)], 2)
+		self.assertEqual(histogram[buckets.index(1)], 1)
+		self.assertEqual(histogram[buckets.index(2.5)], 1)
+		self.assertEqual(histogram[len(buckets) - 1], 1)
+		self.assertEqual(sum(histogram[:-1]), 5)
+		# followed by the sum of the durations
+		self.assertEqual(histogram[-1], int(10_002.16 * MS))
+
+	def test_sampled_searches_are_weighted(self):
+		with patch.dict(frappe.conf, {search_telemetry.SAMPLE_EVERY_CONF: 3}):
+			traces = [search_telemetry.start_trace() for _ in range(9)]
+		search_telemetry.end_trace()
+
+		sampled = [trace for trace in traces if trace]
+		self.assertEqual(len(sampled), 3)
+		self.assertEqual({trace.weight for trace in sampled}, {3})
+
+		self.telemetry.record("sqlite_fts", "marimba", sampled[0], 0)
+		self.assertEqual(self.telemetry.counters["sqlite_fts", "zero_results"], 3)
+		self.assertEqual(self.telemetry.histograms["sqlite_fts"]["total"][0], 3)
+
+		with patch.dict(frappe.conf, {search_telemetry.SAMPLE_EVERY_CONF: 0}):
+			self.assertIsNone(search_telemetry.start_trace())
+		self.assertIs(search_telemetry.get_trace(), search_telemetry.NO_TRACE)
+
+	def test_report(self):
+		for _ in range(18):
+			self.telemetry.record("sqlite_fts", "marimba", make_trace(match=0.4), 3)
+		self.telemetry.record("sqlite_fts", '"tune every bar"', make_trace(match=3, total_ms=150), 0)
+		self.telemetry.record(
+			"sqlite_fts", "xylophone  OR marimba", make_trace(match=40, total_ms=200), 0, cached=True
+		)
+		self.flush()
+
+		stats = {s["stage"]: s for s in search_telemetry.get_latency_stats() if s["engine"] == "sqlite_fts"}
+		match = stats["match"]
+		self.assertEqual(match["count"], 20)
+		self.assertEqual(match["p50_ms"], 0.5)
+		self.assertEqual(match["p95_ms"], 5)
+		self.assertEqual(match["p99_ms"], 50)
+		self.assertEqual(match["avg_ms"], round((18 * 0.4 + 3 + 40) / 20, 3))
+		self.assertIsNone(match["zero_results"])
+		self.assertEqual(stats["total"]["zero_results"], 2)
+		self.assertEqual(stats["total"]["cache_hits"], 1)
+
+		shapes = search_telemetry.get_query_shapes()
+		self.assertEqual(shapes[0], {"engine": "sqlite_fts", "shape": "terms", "count": 18})
+		self.assertEqual({s["shape"]: s["count"] for s in shapes}, {"terms": 18, "phrase": 1, "boolean": 1})
+
+		# cached searches aren't slow, however long the lookup took
+		slow_queries = search_telemetry.get_slow_queries()
+		self.assertEqual(
+			[(q["engine"], q["query"]) for q in slow_queries], [("sqlite_fts", '"tune every bar"')]
+		)
+		self.assertGreaterEqual(slow_queries[0]["ms"], 150)
+
+		zero_result_queries = search_telemetry.get_zero_result_queries()
+		self.assertEqual(
+			{q["query"]: q["count"] for q in zero_result_queries},
+			{'"tune every bar"': 1, "xylophone OR marimba": 1},
+		)
@@ -0,0 +1,323 @@
+# Copyright (c) 2025, Frappe and Contributors
+# See license.txt
+
+import contextlib
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from wiki.wiki.doctype.wiki_page import sqlite_search
+
+RANKING_TEST_PAGES = [
+	("Installation", "How to install the app on a server"),
+	("installation", "Lower case title of the installation page"),
+	("Server Installation Guide", "Setting up a production server"),
+	("Permissions", "Roles and permissions of a user, installation not needed"),
+	("Über Setup", "Über diacritics in the title"),
+	("Hello World", "hello world"),
+	("Greetings", "Hello World"),
+	("Printing", "Say hello, world! to the print format"),
+	("Reports", "A report about the installation of a report server"),
+	("API", "The REST api of the server and its installation"),
+]
+
+RANKING_TEST_QUERIES = [
+	"installation",
+	"Installation",
+	"install",
+	"server",
+	"hello world",
+	'"hello world"',
+	"über",
+	"api",
+	"report*",
+	"perm",
+]
+
+
+def reference_rank_score(item: dict, query: str, query_lower: str, match_case: bool) -> tuple:
+	"""Ranking that was done in python before it moved into the search query"""
+	if query == item["title_raw"]:
+		return (-10, item["rank"])
+	if query_lower == item["title_raw"].lower():
+		return (-9, item["rank"])
+	if query in item["title_raw"]:
+		return (-8, item["rank"])
+	if query_lower in item["title_raw"].lower():
+		return (-7, item["rank"])
+	if sqlite_search._has_exact_match(item["title"], query, match_case):
+		return (-6, item["rank"])
+	if query == item["content_raw"]:
+		return (-5, item["rank"])
+	if query_lower == item["content_raw"].lower():
+		return (-4, item["rank"])
+	if query in item["content_raw"]:
+		return (-3, item["rank"])
+	if query_lower in item["content_raw"].lower():
+		return (-2, item["rank"])
+	if sqlite_search._has_exact_match(item["content"], query, match_case):
+		return (-1, item["rank"])
+	return (0, item["rank"])
+
+
+class TestSQLiteSearch(FrappeTestCase):
+	def setUp(self):
+		self.wiki_page = frappe.get_doc(
+			{
+				"doctype": "Wiki Page",
+				"title": "Sqlite Search Test",
+				"route": "sqlite-search-test",
+				"content": "Incremental indexing of xylophone pages",
+				"published": 1,
+			}
+		).insert()
+		sqlite_search.build_index()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def get_result_names(self, query):
+		return [r["name"] for r in sqlite_search.search(query)["docs"]]
+
+	def test_incremental_update(self):
+		self.assertIn(self.wiki_page.name, self.get_result_names("xylophone"))
+
+		frappe.db.set_value("Wiki Page", self.wiki_page.name, "content", "Now about marimba pages")
+		sqlite_search.update_index([self.wiki_page.name])
+
+		self.assertNotIn(self.wiki_page.name, self.get_result_names("xylophone"))
+		self.assertIn(self.wiki_page.name, self.get_result_names("marimba"))
+		self.assertEqual(sqlite_search.get_index_stats()["docs"], 1)
+
+	def test_paginated_search(self):
+		for i in range(3):
+			frappe.get_doc(
+				{
+					"doctype": "Wiki Page",
+					"title": f"Xylophone Page {i}",
+					"route": f"sqlite-search-test-{i}",
+					"content": "More xylophone content",
+					"published": 1,
+				}
+			).insert()
+		sqlite_search.build_index()
+
+		first_page = sqlite_search.search("xylophone", limit=2)
+		second_page = sqlite_search.search("xylophone", limit=2, offset=2)
+
+		self.assertEqual(first_page["total"], 4)
+		self.assertEqual(len(first_page["docs"]), 2)
+		self.assertEqual(len(second_page["docs"]), 2)
+		self.assertFalse({d["name"] for d in first_page["docs"]} & {d["name"] for d in second_page["docs"]})
+
+	@unittest.skipUnless(sqlite_search.FUZZY_SEARCH_ENABLED, "fts5 trigram tokenizer not available")
+	def test_fuzzy_fallback(self):
+		result = sqlite_search.search("xylophnoe")
+
+		self.assertEqual(result["corrected_query"], "xylophone")
+		self.assertIn(self.wiki_page.name, [r["name"] for r in result["docs"]])
+
+	def test_space_scoped_search(self):
+		frappe.get_doc(
+			{
+				"doctype": "Wiki Space",
+				"route": "sqlite-search-space",
+				"wiki_sidebars": [{"wiki_page": self.wiki_page.name, "parent_label": "Search"}],
+			}
+		).insert()
+		other_page = frappe.get_doc(
+			{
+				"doctype": "Wiki Page",
+				"title": "Other Xylophone Page",
+				"route": "sqlite-search-other",
+				"content": "Xylophone pages outside of the space",
+				"published": 1,
+			}
+		).insert()
+		sqlite_search.build_index()
+
+		result = sqlite_search.search("xylophone", space="sqlite-search-space")
+		self.assertEqual([r["name"] for r in result["docs"]], [self.wiki_page.name])
+		self.assertEqual(result["total"], 1)
+
+		frappe.db.set_value("Wiki Page", self.wiki_page.name, "content", "Now about marimba pages")
+		sqlite_search.build_index(space="sqlite-search-space")
+
+		self.assertFalse(sqlite_search.search("xylophone", space="sqlite-search-space")["docs"])
+		self.assertIn(other_page.name, self.get_result_names("xylophone"))
+
+		# removed from the sidebar, the page stays searchable outside of the space
+		frappe.db.delete("Wiki Group Item", {"wiki_page": self.wiki_page.name})
+		sqlite_search.build_index(space="sqlite-search-space")
+
+		self.assertFalse(sqlite_search.search("marimba", space="sqlite-search-space")["docs"])
+		self.assertIn(self.wiki_page.name, self.get_result_names("marimba"))
+
+	def test_section_results(self):
+		frappe.db.set_value(
+			"Wiki Page",
+			self.wiki_page.name,
+			"content",
+			"Introduction\n\n## Setting up the Marimba\n\nTune every bar\n\n```\n# not a heading\n```",
+		)
+		sqlite_search.update_index([self.wiki_page.name])
+
+		result = sqlite_search.search("tune")["docs"]
+		self.assertEqual(len(result), 1)
+		self.assertEqual(result[0]["name"], self.wiki_page.name)
+		self.assertEqual(result[0]["route"], "sqlite-search-test#setting-up-the-marimba")
+
+		result = sqlite_search.search("introduction")["docs"]
+		self.assertEqual(result[0]["route"], "sqlite-search-test")
+
+	def test_setext_and_html_sections(self):
+		# anchors are numbered in the order of the headings in the rendered page
+		content = (
+			"Tuning\n======\n\nTune every bar\n\n"
+			"<h2>Tuning</h2>\n\nStrike every bar\n\n"
+			"## Tuning\n\nDust every bar"
+		)
+		frappe.db.set_value("Wiki Page", self.wiki_page.name, "content", content)
+		sqlite_search.update_index([self.wiki_page.name])
+
+		for query, route in (
+			("tune", "sqlite-search-test#tuning"),
+			("strike", "sqlite-search-test#tuning-1"),
+			("dust", "sqlite-search-test#tuning-2"),
+		):
+			result = sqlite_search.search(query)["docs"]
+			self.assertEqual(result[0]["route"], route)
+
+		page = frappe.get_doc("Wiki Page", self.wiki_page.name)
+		html, _, _ = page.compile_html(frappe.utils.md_to_html(content))
+		for anchor in ("tuning", "tuning-1", "tuning-2"):
+			self.assertIn(f'id="{anchor}"', html)
+
+	def test_invalid_query(self):
+		with patch.object(sqlite_search._ReaderPool, "reset") as reset:
+			for query in ("AND", "NOT xylophone", "xylophone OR"):
+				self.assertEqual(sqlite_search.search(query), {"docs": [], "total": 0})
+
+		# a malformed query doesn't drop the connections to the index
+		reset.assert_not_called()
+
+	def test_suggestions(self):
+		suggestions = sqlite_search.suggest("incremental xylo")
+
+		self.assertIn("incremental xylophone", suggestions["terms"])
+		self.assertIn(
+			{"title": "Sqlite Search Test", "route": "sqlite-search-test"},
+			sqlite_search.suggest("sqlite sea")["pages"],
+		)
+
+	def test_guest_search(self):
+		guest_page = frappe.get_doc(
+			{
+				"doctype": "Wiki Page",
+				"title": "Guest Xylophone Page",
+				"route": "sqlite-search-guest",
+				"content": "Xylophone pages that guests can read",
+				"published": 1,
+				"allow_guest": 1,
+			}
+		).insert()
+		sqlite_search.build_index()
+
+		result = sqlite_search.search("xylophone", guest=True)
+		self.assertEqual([r["name"] for r in result["docs"]], [guest_page.name])
+		self.assertEqual(result["total"], 1)
+		self.assertEqual(sqlite_search.search("xylophone")["total"], 2)
+
+		self.assertFalse(sqlite_search.suggest("incremental", guest=True)["terms"])
+		self.assertFalse(sqlite_search.suggest("sqlite sea", guest=True)["pages"])
+		self.assertTrue(sqlite_search.suggest("guest xylo", guest=True)["pages"])
+
+	def test_migrate_old_index_layout(self):
+		index_path = sqlite_search._get_index_path()
+		with contextlib.closing(sqlite3.connect(index_path)) as conn:
+			conn.execute(f"PRAGMA user_version = {sqlite_search.INDEX_VERSION - 1}")
+
+		self.assertIn(self.wiki_page.name, self.get_result_names("xylophone"))
+		self.assertEqual(sqlite_search._get_index_version(index_path), sqlite_search.INDEX_VERSION)
+
+	def test_incremental_remove(self):
+		frappe.db.set_value("Wiki Page", self.wiki_page.name, "published", 0)
+		sqlite_search.update_index([self.wiki_page.name])
+
+		self.assertNotIn(self.wiki_page.name, self.get_result_names("xylophone"))
+
+
+class TestSQLiteSearchRanking(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		for i, (title, content) in enumerate(RANKING_TEST_PAGES):
+			frappe.get_doc(
+				{
+					"doctype": "Wiki Page",
+					"title": title,
+					"route": f"sqlite-ranking-test-{i}",
+					"content": content,
+					"published": 1,
+				}
+			).insert()
+		sqlite_search.build_index()
+
+	@classmethod
+	def tearDownClass(cls):
+		frappe.db.rollback()
+		super().tearDownClass()
+
+	def get_reference_scores(self, query):
+		match = sqlite_search._get_match_expression(sqlite_search._clean_query(query)[0], None)
+		with contextlib.closing(sqlite3.connect(sqlite_search._get_index_path())) as conn:
+			rows = conn.execute(
+				f"""
+				SELECT
+					s.name,
+					{sqlite_search.BM25_RANK},
+					fts.title,
+					{sqlite_search.TITLE_SNIPPET},
+					{sqlite_search.CONTENT_SNIPPET},
+					fts.content
+				FROM search_fts fts
+				JOIN search_index s ON s.rowid = fts.rowid
+				WHERE search_fts MATCH ?
+			""",
+				[match],
+			).fetchall()
+
+		query = sqlite_search._strip_exact_match_quotes(query)
+		match_case = any(w.isupper() for w in query)
+		return {
+			row[0]: reference_rank_score(
+				{
+					"rank": row[1],
+					"title_raw": row[2],
+					"title": row[3],
+					"content": row[4],
+					"content_raw": row[5],
+				},
+				query,
+				query.lower(),
+				match_case,
+			)
+			for row in rows
+		}
+
+	def test_ranking_parity(self):
+		for query in RANKING_TEST_QUERIES:
+			with self.subTest(query=query):
+				reference = self.get_reference_scores(query)
+				result = sqlite_search.search(query, limit=len(reference) + 1)
+				names = [d["name"] for d in result["docs"]]
+
+				self.assertEqual(result["total"], len(reference))
+				self.assertEqual(set(names), set(reference))
+
+				# pages with the same score may come in any order
+				scores = [reference[name] for name in names]
+				self.assertEqual(scores, sorted(scores))
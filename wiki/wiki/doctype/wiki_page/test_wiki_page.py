@@ -5,7 +5,20 @@ import unittest
 
 import frappe
 
+from wiki.wiki.doctype.wiki_page.page_bundle import get_page_bundle
+from wiki.wiki.doctype.wiki_page.page_routes import (
+	PAGE_FIELDS,
+	_update_page_route,
+	clear_page_routes,
+	get_page,
+	get_route_map,
+)
 from wiki.wiki.doctype.wiki_page.wiki_page import delete_wiki_page, update
+from wiki.wiki.doctype.wiki_page_revision.wiki_page_revision import (
+	REVISIONS_PAGE_LENGTH,
+	get_revision_contents,
+	get_revisions,
+)
 
 
 class TestWikiPage(unittest.TestCase):
@@ -25,6 +38,8 @@ class TestWikiPage(unittest.TestCase):
 
 	def tearDown(self):
 		self.wiki_page.delete()
+		# test_route_map writes to the route map of the site, reload it from the database
+		clear_page_routes()
 
 	def test_wiki_page_lifecycle(self):
 		self.assertEqual(
@@ -78,3 +93,68 @@ class TestWikiPage(unittest.TestCase):
 
 		sidebar_items = frappe.get_all("Wiki Group Item", {"wiki_page": self.wiki_page.name}, pluck="name")
 		self.assertEqual(sidebar_items, [])
+
+	def test_page_bundle(self):
+		self.wiki_page.content = "## Getting Started\n\nInstall the app"
+		self.wiki_page.save()
+
+		bundle = get_page_bundle(self.wiki_page)
+		self.assertIn('id="getting-started"', bundle.html)
+		self.assertIn("href='#getting-started'", bundle.toc_html)
+		self.assertEqual(bundle.word_count, 5)
+
+		# changed without a save, the stamp no longer matches
+		frappe.db.set_value("Wiki Page", self.wiki_page.name, "content", "## Setup")
+		self.wiki_page.reload()
+		self.assertIn('id="setup"', get_page_bundle(self.wiki_page).html)
+
+	def test_paginated_revisions(self):
+		for i in range(REVISIONS_PAGE_LENGTH):
+			self.wiki_page.update_page(self.wiki_page.title, f"Edit {i}", "Edit")
+
+		first_page = get_revisions(self.wiki_page.name)
+		self.assertEqual(len(first_page["revisions"]), REVISIONS_PAGE_LENGTH)
+		self.assertNotIn("content", first_page["revisions"][0])
+
+		second_page = get_revisions(self.wiki_page.name, first_page["next_cursor"])
+		self.assertEqual(len(second_page["revisions"]), 1)
+		self.assertIsNone(second_page["next_cursor"])
+
+		newest, oldest = first_page["revisions"][0]["name"], second_page["revisions"][0]["name"]
+		contents = get_revision_contents(self.wiki_page.name, [newest, oldest])
+		self.assertIn(f"Edit {REVISIONS_PAGE_LENGTH - 1}", contents[newest])
+		self.assertIn("Hello World", contents[oldest])
+
+		frappe.set_user("Guest")
+		try:
+			self.assertRaises(frappe.PermissionError, get_revision_contents, self.wiki_page.name, [newest])
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_route_map(self):
+		clear_page_routes()
+		self.assertEqual(get_page("wiki/page").name, self.wiki_page.name)
+		self.assertEqual(get_page("/wiki/page/").title, "Hello World Title")
+
+		page = {field: self.wiki_page.get(field) for field in PAGE_FIELDS}
+		_update_page_route("wiki/moved", page, "wiki/page")
+		self.assertIsNone(get_page("wiki/page"))
+		self.assertEqual(get_page("wiki/moved").name, self.wiki_page.name)
+
+		# a renamed page is only known under its new name
+		_update_page_route("wiki/moved", {**page, "name": "renamed-page"}, "wiki/moved", self.wiki_page.name)
+		self.assertEqual(get_page("wiki/moved").name, "renamed-page")
+		self.assertNotIn(self.wiki_page.name, get_route_map().names)
+
+		_update_page_route(None, None, "wiki/moved")
+		self.assertIsNone(get_page("wiki/moved"))
+
+	def test_unique_heading_ids(self):
+		html, toc_html, _ = self.wiki_page.compile_html(
+			"<h2>Setup</h2><p>a</p><h2 id='setup'>Setup</h2><h3>Setup <code>&lt;x&gt;</code></h3>"
+		)
+		self.assertEqual(html.count('id="setup"'), 1)
+		self.assertIn('<h2 id="setup-1">Setup</h2>', html)
+		self.assertIn('id="setup-x"', html)
+		self.assertIn("href='#setup-1'", toc_html)
+		self.assertIn("Setup &lt;x&gt;</a>", toc_html)
@@ -3,6 +3,7 @@
 
 
 import re
+from html import escape, unescape
 from urllib.parse import urlencode
 
 import frappe
@@ -21,15 +22,39 @@ from frappe.utils.html_utils import (
 from frappe.website.doctype.website_settings.website_settings import modify_header_footer_items
 from frappe.website.website_generator import WebsiteGenerator
 
-from wiki.wiki.doctype.wiki_page.search import build_index_in_background, drop_index
+from wiki.render_cache import render_markdown
+from wiki.utils import (
+	HEADING_TAG_PATTERN,
+	HTML_TAG_PATTERN,
+	ID_ATTRIBUTE_PATTERN,
+	get_heading_id,
+	get_unique_heading_id,
+)
+from wiki.wiki.doctype.wiki_page.page_bundle import (
+	clear_page_bundle,
+	compile_page,
+	get_page_bundle,
+	invalidate_neighbours,
+)
+from wiki.wiki.doctype.wiki_page.page_routes import (
+	PAGE_FIELDS,
+	clear_page_routes,
+	get_route_map,
+	update_page_route,
+)
+from wiki.wiki.doctype.wiki_page.search import update_index_in_background
+from wiki.wiki.doctype.wiki_page_revision.wiki_page_revision import get_revision_metadata
 from wiki.wiki.doctype.wiki_settings.wiki_settings import get_all_spaces
 
 
 class WikiPage(WebsiteGenerator):
 	def before_save(self):
-		if old_title := frappe.db.get_value("Wiki Page", self.name, "title"):
-			if old_title != self.title:
+		if old := frappe.db.get_value("Wiki Page", self.name, ["title", "route"], as_dict=True):
+			if old.title != self.title:
 				clear_sidebar_cache()
+			elif old.route != self.route:
+				# neighbours link to the route of the page
+				invalidate_neighbours()
 
 	def after_insert(self):
 		frappe.cache().hdel("website_page", self.name)
@@ -46,8 +71,21 @@ class WikiPage(WebsiteGenerator):
 		revision.insert()
 
 	def on_update(self):
-		build_index_in_background()
-		self.clear_page_html_cache()
+		update_index_in_background([self.name])
+		compile_page(self)
+
+		old_doc = self.get_doc_before_save()
+		if not old_doc or any(old_doc.get(field) != self.get(field) for field in ("route", *PAGE_FIELDS)):
+			update_page_route(self.route, self.as_dict(), old_doc and old_doc.route)
+
+	def after_rename(self, old_name, new_name, merge=False):
+		if merge:
+			# the route of the page merged into this one isn't known anymore
+			frappe.db.after_commit.add(clear_page_routes)
+		else:
+			update_page_route(self.route, self.as_dict(), self.route, old_name)
+		# sidebars and spaces refer to their pages by name
+		invalidate_neighbours()
 
 	def on_trash(self):
 		frappe.db.sql("DELETE FROM `tabWiki Page Revision Item` WHERE wiki_page = %s", self.name)
@@ -77,8 +115,8 @@ class WikiPage(WebsiteGenerator):
 
 		self.clear_page_html_cache()
 		clear_sidebar_cache()
-		drop_index()
-		build_index_in_background()
+		update_index_in_background([self.name])
+		update_page_route(None, None, self.route)
 
 	def sanitize_html(self):
 		"""
@@ -175,53 +213,67 @@ class WikiPage(WebsiteGenerator):
 			parents = []
 			splits = self.route.split("/")
 			if splits:
+				route_map = get_route_map()
 				for index, _route in enumerate(splits[:-1], start=1):
 					full_route = "/".join(splits[:index])
-					wiki_page = frappe.get_all(
-						"Wiki Page", filters=[["route", "=", full_route]], fields=["title"]
-					)
-					if wiki_page:
-						parents.append({"route": "/" + full_route, "label": wiki_page[0].title})
+					if wiki_page := route_map.get_page(full_route):
+						parents.append({"route": "/" + full_route, "label": wiki_page.title})
 
 				context.parents = parents
 
+	def get_space(self):
+		"""
+		Wiki Space (name and route) whose sidebar the page is in. The sidebar,
+		not the route of the page, decides the space its sidebar and patches
+		belong to.
+		"""
+		if name := frappe.get_value("Wiki Group Item", {"wiki_page": self.name}, "parent"):
+			return frappe._dict(name=name, route=frappe.get_cached_value("Wiki Space", name, "route"))
+
 	def get_space_route(self):
-		if space := frappe.get_value("Wiki Group Item", {"wiki_page": self.name}, "parent"):
-			return frappe.get_value("Wiki Space", space, "route")
+		if space := self.get_space():
+			return space.route
 		else:
 			frappe.throw("Wiki Page doesn't have a Wiki Space associated with it. Please add them via Desk.")
 
 	def calculate_toc_html(self, html):
-		from bs4 import BeautifulSoup
+		return self.compile_html(html)[1]
 
-		soup = BeautifulSoup(html, "html.parser")
-		headings = soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"])
-		titleHref = re.sub(r"[^\u00C0-\u1FFF\u2C00-\uD7FF\w\- ]", "", self.title).replace(" ", "-").lower()
+	def compile_html(self, html):
+		"""
+		Rendered content with unique ids on its headings, the TOC HTML and the
+		word count of the page, in a single pass over the html without parsing
+		it into a tree
+		"""
+		titleHref = get_heading_id(self.title)
+		seen = {titleHref}
 		# Add the title as the first entry in the TOC
-		toc_html = f"<li><a  style='padding-left: 1rem' href='#{titleHref}'>{self.title}</a></li>"
-
-		for heading in headings:
-			title = heading.get_text().strip()
-			heading_id = re.sub(r"[^\u00C0-\u1FFF\u2C00-\uD7FF\w\- ]", "", title).replace(" ", "-").lower()
-			heading["id"] = heading_id
-			title = heading.get_text().strip()
-			level = int(heading.name[1]) + 1
-			toc_entry = (
-				f"<li><a style='padding-left: {level - 1}rem' href='#{heading['id']}'>{title}</a></li>"
+		toc = [f"<li><a  style='padding-left: 1rem' href='#{titleHref}'>{self.title}</a></li>"]
+
+		def set_heading_id(match):
+			level, attributes, inner = match.groups()
+			title = unescape(HTML_TAG_PATTERN.sub("", inner)).strip()
+			heading_id = get_unique_heading_id(title, seen)
+			toc.append(
+				f"<li><a style='padding-left: {level}rem' href='#{heading_id}'>{escape(title)}</a></li>"
 			)
-			toc_html += toc_entry
+			attributes = ID_ATTRIBUTE_PATTERN.sub("", attributes)
+			return f'<h{level}{attributes} id="{heading_id}">{inner}</h{level}>'
 
-		return toc_html
+		html = HEADING_TAG_PATTERN.sub(set_heading_id, html or "")
+		return html, "".join(toc), len(HTML_TAG_PATTERN.sub(" ", html).split())
 
 	def get_context(self, context):
 		self.verify_permission()
 		self.set_breadcrumbs(context)
 
+		space = self.get_space() or frappe._dict()
+		wiki_space_name = space.name
+
 		# Get count of pending patches for admin banner
 		if frappe.session.user != "Guest":
 			context.is_admin = frappe.has_permission("Wiki Page Patch", "write")
 			if context.is_admin:
-				wiki_space_name = frappe.get_value("Wiki Group Item", {"wiki_page": self.name}, "parent")
 				# Get all Wiki Pages in this space
 				wiki_pages_in_space = frappe.get_all(
 					"Wiki Group Item", filters={"parent": wiki_space_name}, pluck="wiki_page"
@@ -256,7 +308,6 @@ class WikiPage(WebsiteGenerator):
 
 		context.spaces = ordered_wiki_spaces
 
-		wiki_space_name = frappe.get_value("Wiki Group Item", {"wiki_page": self.name}, "parent")
 		wiki_space = (
 			frappe.get_cached_doc("Wiki Space", wiki_space_name) if wiki_space_name else frappe._dict()
 		)
@@ -266,6 +317,8 @@ class WikiPage(WebsiteGenerator):
 			frappe.local.conf.developer_mode or frappe.local.dev_server
 		)  # Changes will invalidate HTML cache
 		context.navbar_search = wiki_settings.add_search_bar
+		# only the sqlite index keeps the term list suggestions are made from
+		context.search_suggestions = wiki_settings.use_sqlite_for_search
 		context.light_mode_logo = wiki_space.light_mode_logo or wiki_settings.logo
 		context.dark_mode_logo = wiki_space.dark_mode_logo or wiki_settings.dark_mode_logo
 		if wiki_space.light_mode_logo or wiki_space.dark_mode_logo:
@@ -273,7 +326,7 @@ class WikiPage(WebsiteGenerator):
 		context.script = wiki_settings.javascript
 		context.show_feedback = wiki_settings.enable_feedback
 		context.ask_for_contact_details = wiki_settings.ask_for_contact_details
-		context.wiki_search_scope = self.get_space_route()
+		context.wiki_search_scope = space.route
 		context.metatags = {
 			"title": self.title,
 			"description": self.meta_description,
@@ -284,29 +337,22 @@ class WikiPage(WebsiteGenerator):
 		}
 		context.edit_wiki_page = frappe.form_dict.get("editWiki")
 		context.new_wiki_page = frappe.form_dict.get("newWiki")
-		context.last_revision = self.get_last_revision()
 		context.show_dropdown = frappe.session.user != "Guest"
-		context.number_of_revisions = frappe.db.count("Wiki Page Revision Item", {"wiki_page": self.name})
 		# TODO: group all context values
 		context.hide_on_sidebar = frappe.get_value(
 			"Wiki Group Item", {"wiki_page": self.name}, "hide_on_sidebar"
 		)
-		html = frappe.utils.md_to_html(self.content)
+		bundle = get_page_bundle(self)
 		context.content = self.content
-		context.page_toc_html = (
-			self.calculate_toc_html(html) if wiki_settings.enable_table_of_contents else None
-		)
+		context.content_html = bundle.html
+		context.word_count = bundle.word_count
+		context.prev_page = bundle.prev_page
+		context.next_page = bundle.next_page
+		context.page_toc_html = bundle.toc_html if wiki_settings.enable_table_of_contents else None
 
-		revisions = frappe.db.get_all(
-			"Wiki Page Revision",
-			filters=[["wiki_page", "=", self.name]],
-			fields=["content", "creation", "owner", "name", "raised_by", "raised_by_username"],
-		)
-		context.current_revision = revisions[0]
-		if len(revisions) > 1:
-			context.previous_revision = revisions[1]
-		else:
-			context.previous_revision = {"content": "<h3>No Revisions</h3>", "name": ""}
+		# only the head revision, the revisions modal pages through the rest with get_revisions
+		head_revision = get_revision_metadata(self.name, limit=1)
+		context.current_revision = context.last_revision = head_revision[0] if head_revision else None
 
 		context.show_sidebar = True
 		context.hide_login = True
@@ -315,6 +361,7 @@ class WikiPage(WebsiteGenerator):
 			context.title, context.content = frappe.db.get_value(
 				"Wiki Page Patch", frappe.form_dict.wikiPagePatch, ["new_title", "new_code"]
 			)
+			context.content_html = render_markdown(context.content)
 		if wiki_space.favicon:
 			context.favicon = wiki_space.favicon
 		context = context.update(
@@ -392,12 +439,6 @@ class WikiPage(WebsiteGenerator):
 
 		return self.get_items(sidebar)
 
-	def get_last_revision(self):
-		last_revision = frappe.db.get_value(
-			"Wiki Page Revision Item", filters={"wiki_page": self.name}, fieldname="parent"
-		)
-		return frappe.get_doc("Wiki Page Revision", last_revision)
-
 	def clone(self, original_space, new_space):
 		# used in after_insert of Wiki Page to resist create of Wiki Page Revision
 		frappe.local.in_clone = True
@@ -432,13 +473,7 @@ class WikiPage(WebsiteGenerator):
 			frappe.db.set_value(dt, dn, field, new_doc.get(field))
 
 	def clear_page_html_cache(self):
-		html_cache_key = f"wiki_page_html:{self.name}"
-
-		frappe.cache.hdel(html_cache_key, "content")
-		frappe.cache.hdel(html_cache_key, "page_title")
-		frappe.cache.hdel(html_cache_key, "toc_html")
-		frappe.cache.hdel(html_cache_key, "next_page")
-		frappe.cache.hdel(html_cache_key, "prev_page")
+		clear_page_bundle(self.name)
 
 
 def get_open_contributions():
@@ -464,6 +499,7 @@ def get_open_drafts():
 def clear_sidebar_cache():
 	for key in frappe.cache.hgetall("wiki_sidebar").keys():
 		frappe.cache.hdel("wiki_sidebar", key)
+	invalidate_neighbours()
 
 
 @frappe.whitelist()
@@ -509,7 +545,7 @@ def extract_images_from_html(content):
 
 @frappe.whitelist()
 def convert_markdown(markdown):
-	html = frappe.utils.md_to_html(markdown)
+	html = render_markdown(markdown)
 	return html
 
 
@@ -667,7 +703,10 @@ def update_page_settings(name, settings):
 		"Wiki Group Item", {"wiki_page": name}, "hide_on_sidebar", sbool(settings.hide_on_sidebar)
 	)
 
+	page = frappe.db.get_value("Wiki Page", name, ["route", *PAGE_FIELDS], as_dict=True)
 	frappe.db.set_value("Wiki Page", name, "route", settings.route)
+	update_page_route(settings.route, page, page.route)
+	update_index_in_background([name])
 
 
 @frappe.whitelist()
@@ -682,15 +721,6 @@ def get_markdown_content(wikiPageName, wikiPagePatch):
 
 @frappe.whitelist(allow_guest=True)
 def get_page_content(wiki_page_name: str):
-	html_cache_key = f"wiki_page_html:{wiki_page_name}"
-
-	content = frappe.cache.hget(html_cache_key, "content")
-	page_title = frappe.cache.hget(html_cache_key, "page_title")
-	# TOC can be "None" if user has disabled it
-	toc_html = frappe.cache.hget(html_cache_key, "toc_html")
-	next_page = frappe.cache.hget(html_cache_key, "next_page")
-	prev_page = frappe.cache.hget(html_cache_key, "prev_page")
-
 	wiki_page = frappe.get_cached_doc("Wiki Page", wiki_page_name)
 	wiki_settings = frappe.get_single("Wiki Settings")
 
@@ -700,48 +730,15 @@ def get_page_content(wiki_page_name: str):
 		frappe.local.response.http_status_code = 403
 		frappe.throw(_("You are not permitted to access this page"), frappe.PermissionError)
 
-	if not all([content, page_title, next_page, prev_page]):
-		md_content = wiki_page.content
-
-		content = frappe.utils.md_to_html(md_content)
-		toc_html = wiki_page.calculate_toc_html(content) if wiki_settings.enable_table_of_contents else None
-		page_title = wiki_page.title
-
-		wiki_space_name = frappe.get_value("Wiki Group Item", {"wiki_page": wiki_page_name}, "parent")
-		sidebar_items = frappe.get_all(
-			"Wiki Group Item",
-			filters={"parent": wiki_space_name, "hide_on_sidebar": 0},
-			fields=["wiki_page", "idx"],
-			order_by="idx",
-		)
-
-		current_idx = next(
-			(i for i, item in enumerate(sidebar_items) if item.wiki_page == wiki_page_name), -1
-		)
-		next_page = prev_page = None
-
-		if current_idx != -1:
-			if current_idx > 0:
-				prev_page = frappe.get_value(
-					"Wiki Page", sidebar_items[current_idx - 1].wiki_page, ["title", "route"], as_dict=True
-				)
-			if current_idx < len(sidebar_items) - 1:
-				next_page = frappe.get_value(
-					"Wiki Page", sidebar_items[current_idx + 1].wiki_page, ["title", "route"], as_dict=True
-				)
-
-		frappe.cache.hset(html_cache_key, "content", content)
-		frappe.cache.hset(html_cache_key, "page_title", page_title)
-		frappe.cache.hset(html_cache_key, "toc_html", toc_html)
-		frappe.cache.hset(html_cache_key, "next_page", next_page)
-		frappe.cache.hset(html_cache_key, "prev_page", prev_page)
-
+	bundle = get_page_bundle(wiki_page)
 	return {
-		"title": page_title,
-		"content": content,
-		"toc_html": toc_html,
-		"next_page": next_page,
-		"prev_page": prev_page,
+		"title": wiki_page.title,
+		"content": bundle.html,
+		# TOC is None if user has disabled it
+		"toc_html": bundle.toc_html if wiki_settings.enable_table_of_contents else None,
+		"next_page": bundle.next_page,
+		"prev_page": bundle.prev_page,
+		"word_count": bundle.word_count,
 	}
 import frappe
 from frappe.utils.pdf import get_pdf
@@ -820,6 +817,7 @@ def download_wiki_pdf(page_name):
 	# OVERRIDE CONTENT
 	# The template show.html uses `content` variable.
 	context.content = final_content
+	context.content_html = render_markdown(final_content)
 
 	html = frappe.render_template(
 		"wiki/wiki/doctype/wiki_page/templates/wiki_page.html", context
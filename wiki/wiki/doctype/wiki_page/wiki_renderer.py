@@ -5,29 +5,29 @@ import frappe
 from frappe.website.page_renderers.document_page import DocumentPage
 from frappe.website.utils import build_response
 
+from wiki.wiki.doctype.wiki_page.page_routes import get_first_page_route, get_page
 from wiki.wiki.doctype.wiki_page.wiki_page import get_sidebar_for_page
+from wiki.wiki.doctype.wiki_space.space_routes import get_space
 
 reg = re.compile("<!--sidebar-->")
 
 
 class WikiPageRenderer(DocumentPage):
 	def can_render(self):
-		doctype = "Wiki Page"
+		# resolved from the cached route map and route trie, without a query per request
 		try:
-			self.docname = frappe.db.get_value(doctype, {"route": self.path, "published": 1}, "name")
-			if self.docname:
-				self.doctype = doctype
+			page = get_page(self.path)
+			if page and page.published:
+				self.doctype, self.docname = "Wiki Page", page.name
 				return True
 		except Exception as e:
 			if not frappe.db.is_missing_column(e):
 				raise e
 
-		if wiki_space_name := frappe.db.get_value("Wiki Space", {"route": self.path}):
-			wiki_space = frappe.get_cached_doc("Wiki Space", wiki_space_name)
-			topmost_wiki_route = frappe.db.get_value(
-				"Wiki Page", wiki_space.wiki_sidebars[0].wiki_page, "route"
-			)
-			frappe.redirect(f"/{quote(topmost_wiki_route)}")
+		space = get_space(self.path)
+		if space and space.route.strip("/") == self.path.strip("/"):
+			if topmost_wiki_route := get_first_page_route(space.name):
+				frappe.redirect(f"/{quote(topmost_wiki_route)}")
 
 	def render(self):
 		html = self.get_html()
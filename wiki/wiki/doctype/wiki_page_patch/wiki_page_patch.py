@@ -12,6 +12,7 @@ from frappe.model.document import Document
 from frappe.website.utils import cleanup_page_name
 
 from wiki.utils import apply_changes, apply_markdown_diff, highlight_changes
+from wiki.wiki.doctype.wiki_page.page_bundle import invalidate_neighbours
 
 
 class WikiPagePatch(Document):
@@ -44,6 +45,7 @@ class WikiPagePatch(Document):
 		if self.new or self.new_title != self.wiki_page_doc.title:
 			for key in frappe.cache().hgetall("wiki_sidebar").keys():
 				frappe.cache().hdel("wiki_sidebar", key)
+			invalidate_neighbours()
 
 	def create_new_wiki_page(self):
 		self.new_wiki_page = frappe.new_doc("Wiki Page")
@@ -3,29 +3,108 @@
 
 
 import frappe
+from frappe import _
 from frappe.model.document import Document
-from frappe.utils import md_to_html, pretty_date
+from frappe.query_builder import Order
+from frappe.utils import pretty_date
+
+from wiki.render_cache import render_markdown
+
+REVISIONS_PAGE_LENGTH = 20
 
 
 class WikiPageRevision(Document):
 	pass
 
 
+def get_revision_metadata(wiki_page_name, cursor=None, limit=REVISIONS_PAGE_LENGTH):
+	"""
+	Revisions of a page without their content, newest first. The cursor is the
+	creation and name of the last revision of the previous page of results.
+	"""
+	Revision = frappe.qb.DocType("Wiki Page Revision")
+	RevisionItem = frappe.qb.DocType("Wiki Page Revision Item")
+	query = (
+		frappe.qb.from_(Revision)
+		.join(RevisionItem)
+		.on(RevisionItem.parent == Revision.name)
+		.select(
+			Revision.name,
+			Revision.creation,
+			Revision.modified,
+			Revision.owner,
+			Revision.raised_by,
+			Revision.raised_by_username,
+		)
+		.where(RevisionItem.wiki_page == wiki_page_name)
+		.orderby(Revision.creation, order=Order.desc)
+		.orderby(Revision.name, order=Order.desc)
+		.limit(limit)
+	)
+
+	if cursor:
+		creation, name = cursor.split("|", 1)
+		query = query.where(
+			(Revision.creation < creation) | ((Revision.creation == creation) & (Revision.name < name))
+		)
+
+	return query.run(as_dict=True)
+
+
 @frappe.whitelist(allow_guest=True)
-def get_revisions(wiki_page_name):
-	revisions = frappe.db.get_all(
+def get_revisions(wiki_page_name, cursor=None):
+	"""A page of revision metadata, fetch their content with get_revision_contents"""
+	check_page_access(wiki_page_name)
+	revisions = get_revision_metadata(wiki_page_name, cursor, REVISIONS_PAGE_LENGTH + 1)
+	next_cursor = None
+	if len(revisions) > REVISIONS_PAGE_LENGTH:
+		revisions = revisions[:REVISIONS_PAGE_LENGTH]
+		next_cursor = f"{revisions[-1].creation}|{revisions[-1].name}"
+
+	return {
+		"revisions": [
+			{
+				"name": revision.name,
+				"revision_time": pretty_date(revision.creation),
+				"author": revision.raised_by_username or revision.raised_by or revision.owner,
+			}
+			for revision in revisions
+		],
+		"next_cursor": next_cursor,
+	}
+
+
+@frappe.whitelist(allow_guest=True)
+def get_revision_contents(wiki_page_name, revisions):
+	"""Rendered content of the given revisions of a page, by revision name"""
+	check_page_access(wiki_page_name)
+	names = frappe.parse_json(revisions)[:REVISIONS_PAGE_LENGTH]
+	if not names:
+		return {}
+
+	contents = frappe.get_all(
 		"Wiki Page Revision",
-		{"wiki_page": wiki_page_name},
-		["content", "creation", "owner", "raised_by", "raised_by_username"],
+		filters=[["name", "in", names], ["wiki_page", "=", wiki_page_name]],
+		fields=["name", "content"],
 	)
+	return {revision.name: render_markdown(revision.content) for revision in contents}
+
+
+def check_page_access(wiki_page_name):
+	"""Revisions are visible to whoever can view the page"""
+	page = frappe.db.get_value("Wiki Page", wiki_page_name, ["published", "allow_guest"], as_dict=True)
+	if not page:
+		raise frappe.DoesNotExistError
 
-	for revision in revisions:
-		revision.revision_time = pretty_date(revision.creation)
-		revision.author = revision.raised_by_username or revision.raised_by or revision.owner
-		revision.content = md_to_html(revision.content)
-		del revision.raised_by_username
-		del revision.raised_by
-		del revision.creation
-		del revision.owner
+	if frappe.session.user == "Guest":
+		permitted = (
+			page.published
+			and page.allow_guest
+			and not frappe.db.get_single_value("Wiki Settings", "disable_guest_access")
+		)
+	else:
+		permitted = page.published or frappe.has_permission("Wiki Page", "read", wiki_page_name)
 
-	return revisions
+	if not permitted:
+		frappe.local.response.http_status_code = 403
+		frappe.throw(_("You are not permitted to access this page"), frappe.PermissionError)
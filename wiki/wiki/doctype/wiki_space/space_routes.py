@@ -0,0 +1,111 @@
+# Copyright (c) 2025, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import frappe
+
+from wiki.utils import VersionedHashCache
+
+# Routes of all Wiki Spaces are kept in a redis hash of name -> route, every
+# process resolves paths through a trie built from it
+SPACE_ROUTES_KEY = "wiki_space_routes"
+SPACE_ROUTES_VERSION_KEY = "wiki_space_routes_version"
+
+
+class RouteTrie:
+	"""
+	Trie of route segments. Resolves a path to the value of the longest route
+	that is a prefix of it, segment wise, in O(length of the path).
+	"""
+
+	__slots__ = ("children", "value")
+
+	def __init__(self):
+		self.children: dict[str, RouteTrie] = {}
+		self.value = None
+
+	def insert(self, route: str, value):
+		node = self
+		for segment in _split(route):
+			node = node.children.setdefault(segment, RouteTrie())
+		node.value = value
+
+	def remove(self, route: str):
+		"""Remove the value of the route, branches left without values are pruned"""
+		segments = _split(route)
+		nodes = [self]
+		for segment in segments:
+			if not (node := nodes[-1].children.get(segment)):
+				return
+			nodes.append(node)
+
+		nodes[-1].value = None
+		for i in range(len(segments), 0, -1):
+			if nodes[i].value is not None or nodes[i].children:
+				break
+			del nodes[i - 1].children[segments[i - 1]]
+
+	def longest_prefix(self, path: str):
+		node, value = self, self.value
+		for segment in _split(path):
+			if not (node := node.children.get(segment)):
+				break
+			if node.value is not None:
+				value = node.value
+		return value
+
+
+def _split(route: str) -> list[str]:
+	return [segment for segment in (route or "").split("/") if segment]
+
+
+def get_space(path: str) -> frappe._dict | None:
+	"""Wiki Space (name and route) whose route is the longest prefix of the path"""
+	return _space_routes.get().longest_prefix(path)
+
+
+def get_space_route(path: str) -> str | None:
+	if space := get_space(path):
+		return space.route
+
+
+def update_space_route(
+	name: str, route: str | None, old_route: str | None = None, old_name: str | None = None
+):
+	"""
+	Track a new, moved (route is changed), renamed (old_name is given) or deleted
+	(route is None) Wiki Space once the transaction commits
+	"""
+	frappe.db.after_commit.add(lambda: _update_space_route(name, route, old_route, old_name))
+
+
+def _update_space_route(name, route, old_route=None, old_name=None):
+	def apply(trie):
+		if old_route:
+			trie.remove(old_route)
+		if route:
+			trie.insert(route, frappe._dict(name=name, route=route))
+
+	deleted = [old_name] if old_name else []
+	if route:
+		_space_routes.update({name: route}, deleted=deleted, apply=apply)
+	else:
+		_space_routes.update({}, deleted=[*deleted, name], apply=apply)
+
+
+def _build_trie(routes: dict[str, str]) -> RouteTrie:
+	trie = RouteTrie()
+	for name, route in routes.items():
+		trie.insert(route, frappe._dict(name=name, route=route))
+	return trie
+
+
+def _load_routes() -> dict[str, str]:
+	return dict(frappe.get_all("Wiki Space", fields=["name", "route"], as_list=True))
+
+
+_space_routes = VersionedHashCache(SPACE_ROUTES_KEY, SPACE_ROUTES_VERSION_KEY, _build_trie, _load_routes)
+
+
+def clear_space_routes():
+	"""Reload the routes from the database on next use, eg. after a migration"""
+	_space_routes.clear()
@@ -1,9 +1,68 @@
 # Copyright (c) 2023, Frappe and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from wiki.utils import get_redis, make_key
+from wiki.wiki.doctype.wiki_space.space_routes import (
+	SPACE_ROUTES_KEY,
+	RouteTrie,
+	_update_space_route,
+	get_space,
+	get_space_route,
+)
+
 
 class TestWikiSpace(FrappeTestCase):
-	pass
+	def test_route_trie(self):
+		trie = RouteTrie()
+		trie.insert("docs", "docs")
+		trie.insert("docs/v2", "v2")
+		trie.insert("documentation", "documentation")
+
+		self.assertEqual(trie.longest_prefix("docs/v2/install"), "v2")
+		self.assertEqual(trie.longest_prefix("/docs/install/"), "docs")
+		self.assertEqual(trie.longest_prefix("documentation/install"), "documentation")
+		self.assertIsNone(trie.longest_prefix("doc/install"))
+
+		trie.remove("docs/v2")
+		self.assertEqual(trie.longest_prefix("docs/v2/install"), "docs")
+		self.assertFalse(trie.children["docs"].children)
+
+	def test_space_route_changes(self):
+		space = frappe.get_doc({"doctype": "Wiki Space", "route": "route-trie-test"}).insert()
+		_update_space_route(space.name, space.route)
+		self.assertEqual(get_space_route("route-trie-test/new-wiki-page"), "route-trie-test")
+
+		_update_space_route(space.name, "route-trie-test/v2", space.route)
+		self.assertIsNone(get_space_route("route-trie-test/new-wiki-page"))
+		self.assertEqual(get_space_route("route-trie-test/v2/page"), "route-trie-test/v2")
+
+		# a renamed space is only known under its new name
+		_update_space_route("renamed-space", "route-trie-test/v2", "route-trie-test/v2", space.name)
+		self.assertEqual(get_space("route-trie-test/v2/page").name, "renamed-space")
+		self.assertNotIn(space.name.encode(), get_redis().hkeys(make_key(SPACE_ROUTES_KEY)))
+
+		_update_space_route("renamed-space", None, "route-trie-test/v2")
+		self.assertIsNone(get_space_route("route-trie-test/v2/page"))
+
+	def test_page_space_is_its_sidebar(self):
+		frappe.get_doc({"doctype": "Wiki Space", "route": "route-space-test"}).insert()
+		page = frappe.get_doc(
+			{"doctype": "Wiki Page", "title": "Sidebar Space Test", "route": "route-space-test/page"}
+		).insert()
+		sidebar_space = frappe.get_doc(
+			{
+				"doctype": "Wiki Space",
+				"route": "sidebar-space-test",
+				"wiki_sidebars": [{"wiki_page": page.name, "parent_label": "Test"}],
+			}
+		).insert()
+
+		# the route is under one space, the sidebar and patches belong to the other
+		self.assertEqual(page.get_space().name, sidebar_space.name)
+		self.assertEqual(page.get_space_route(), "sidebar-space-test")
+
+	def tearDown(self):
+		frappe.db.rollback()
@@ -6,7 +6,10 @@ import frappe
 import pymysql
 from frappe.model.document import Document
 
-from wiki.wiki.doctype.wiki_page.search import build_index_in_background, drop_index
+from wiki.wiki.doctype.wiki_page.page_bundle import invalidate_neighbours
+from wiki.wiki.doctype.wiki_page.page_routes import PAGE_FIELDS, update_page_route
+from wiki.wiki.doctype.wiki_page.search import update_index_in_background
+from wiki.wiki.doctype.wiki_space.space_routes import update_space_route
 
 
 class WikiSpace(Document):
@@ -42,7 +45,9 @@ class WikiSpace(Document):
 			return
 
 		for i, wiki_sidebar in enumerate(self.wiki_sidebars):
-			wiki_page = frappe.get_value("Wiki Page", wiki_sidebar.wiki_page, ["name", "route"], as_dict=1)
+			wiki_page = frappe.get_value(
+				"Wiki Page", wiki_sidebar.wiki_page, ["route", *PAGE_FIELDS], as_dict=1
+			)
 			wiki_page_route = wiki_page.route.replace(old_route, self.route, 1)
 
 			frappe.publish_progress(
@@ -59,6 +64,7 @@ class WikiSpace(Document):
 						"route",
 						wiki_page_route,
 					)
+					update_page_route(wiki_page_route, wiki_page, wiki_page.route)
 			except Exception as e:
 				if isinstance(e, pymysql.err.IntegrityError):
 					frappe.throw(f"Wiki Page with route <b>{wiki_page.route}</b> already exists.")
@@ -66,17 +72,43 @@ class WikiSpace(Document):
 					raise e
 
 	def on_update(self):
-		build_index_in_background()
+		update_index_in_background(self.get_reindexable_pages())
+
+		old_doc = self.get_doc_before_save()
+		if not old_doc or old_doc.route != self.route:
+			update_space_route(self.name, self.route, old_doc and old_doc.route)
 
 		# clear sidebar cache
 		frappe.cache().hdel("wiki_sidebar", self.name)
+		invalidate_neighbours()
 
-	def on_trash(self):
-		drop_index()
+	def after_rename(self, old_name, new_name, merge=False):
+		update_space_route(self.name, self.route, self.route, old_name)
 
+		# clear sidebar cache
+		frappe.cache().hdel("wiki_sidebar", old_name)
+		# pages and first pages of spaces are looked up by the name of their space
+		invalidate_neighbours()
+
+	def on_trash(self):
 		# clear sidebar cache
 		frappe.cache().hdel("wiki_sidebar", self.name)
-		build_index_in_background()
+		invalidate_neighbours()
+		update_index_in_background([row.wiki_page for row in self.wiki_sidebars])
+		update_space_route(self.name, None, self.route)
+
+	def get_reindexable_pages(self):
+		"""Wiki Pages whose space or route changed with this save"""
+		pages = {row.wiki_page for row in self.wiki_sidebars}
+		old_doc = self.get_doc_before_save()
+		if not old_doc:
+			return list(pages)
+
+		old_pages = {row.wiki_page for row in old_doc.wiki_sidebars}
+		if old_doc.route != self.route:
+			return list(pages | old_pages)
+
+		return list(pages ^ old_pages)
 
 	@frappe.whitelist()
 	def clone_wiki_space_in_background(self, new_space_route):
@@ -139,3 +171,4 @@ def update_sidebar(sidebar_items):
 
 	for key in frappe.cache().hgetall("wiki_sidebar").keys():
 		frappe.cache().hdel("wiki_sidebar", key)
+	invalidate_neighbours()
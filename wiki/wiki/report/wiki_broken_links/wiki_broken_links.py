@@ -6,6 +6,8 @@ import requests
 from bs4 import BeautifulSoup
 from frappe import _
 
+from wiki.render_cache import render_markdown
+
 
 def execute(filters: dict | None = None):
 	"""Return columns and data for the report.
@@ -74,7 +76,7 @@ def get_data(filters: dict | None = None) -> list[list]:
 def get_broken_links(
 	md_content: str, include_images: bool = True, include_relative_urls: bool = False
 ) -> list[str]:
-	html = frappe.utils.md_to_html(md_content)
+	html = render_markdown(md_content)
 	soup = BeautifulSoup(html, "html.parser")
 
 	links = soup.find_all("a")
@@ -0,0 +1,15 @@
+// Copyright (c) 2025, Frappe and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Wiki Search Telemetry"] = {
+  filters: [
+    {
+      fieldname: "view",
+      label: __("View"),
+      fieldtype: "Select",
+      options: ["Latency", "Query Shapes", "Slow Queries", "Zero Result Queries"],
+      default: "Latency",
+      reqd: 1,
+    },
+  ],
+};
@@ -0,0 +1,57 @@
+# Copyright (c) 2025, Frappe and contributors
+# For license information, please see license.txt
+
+from frappe import _
+
+from wiki.wiki.doctype.wiki_page import search_telemetry
+
+
+def execute(filters: dict | None = None):
+	"""Search telemetry aggregated in redis by search.search, see search_telemetry"""
+	view = (filters or {}).get("view") or "Latency"
+
+	if view == "Query Shapes":
+		return get_query_shape_columns(), search_telemetry.get_query_shapes()
+	if view == "Slow Queries":
+		return get_slow_query_columns(), search_telemetry.get_slow_queries()
+	if view == "Zero Result Queries":
+		return get_zero_result_columns(), search_telemetry.get_zero_result_queries()
+
+	return get_latency_columns(), search_telemetry.get_latency_stats()
+
+
+def get_latency_columns() -> list[dict]:
+	return [
+		{"label": _("Engine"), "fieldname": "engine", "fieldtype": "Data", "width": 150},
+		{"label": _("Stage"), "fieldname": "stage", "fieldtype": "Data", "width": 100},
+		{"label": _("Queries"), "fieldname": "count", "fieldtype": "Int", "width": 100},
+		{"label": _("Zero Results"), "fieldname": "zero_results", "fieldtype": "Int", "width": 110},
+		{"label": _("Cache Hits"), "fieldname": "cache_hits", "fieldtype": "Int", "width": 100},
+		{"label": _("Average (ms)"), "fieldname": "avg_ms", "fieldtype": "Float", "width": 110},
+		{"label": _("p50 (ms)"), "fieldname": "p50_ms", "fieldtype": "Float", "width": 100},
+		{"label": _("p95 (ms)"), "fieldname": "p95_ms", "fieldtype": "Float", "width": 100},
+		{"label": _("p99 (ms)"), "fieldname": "p99_ms", "fieldtype": "Float", "width": 100},
+	]
+
+
+def get_query_shape_columns() -> list[dict]:
+	return [
+		{"label": _("Engine"), "fieldname": "engine", "fieldtype": "Data", "width": 150},
+		{"label": _("Shape"), "fieldname": "shape", "fieldtype": "Data", "width": 120},
+		{"label": _("Queries"), "fieldname": "count", "fieldtype": "Int", "width": 100},
+	]
+
+
+def get_slow_query_columns() -> list[dict]:
+	return [
+		{"label": _("Engine"), "fieldname": "engine", "fieldtype": "Data", "width": 150},
+		{"label": _("Query"), "fieldname": "query", "fieldtype": "Data", "width": 400},
+		{"label": _("Slowest (ms)"), "fieldname": "ms", "fieldtype": "Float", "width": 120},
+	]
+
+
+def get_zero_result_columns() -> list[dict]:
+	return [
+		{"label": _("Query"), "fieldname": "query", "fieldtype": "Data", "width": 400},
+		{"label": _("Searches"), "fieldname": "count", "fieldtype": "Int", "width": 100},
+	]
@@ -4,15 +4,13 @@
 import re
 
 import frappe
-from frappe.utils import cstr, strip_html_tags, update_progress_bar
+from frappe.utils import cint, cstr, strip_html_tags
 from frappe.utils.redis_wrapper import RedisWrapper
 
 from wiki.search import Search
 
 UNSAFE_CHARS = re.compile(r"[\[\]{}<>+]")
 
-INDEX_BUILD_FLAG = "wiki_page_index_in_progress"
-
 
 class WikiSearch(Search):
 	def __init__(self) -> None:
@@ -20,30 +18,69 @@ class WikiSearch(Search):
 			{"name": "title", "weight": 5},
 			{"name": "content", "weight": 2},
 			{"name": "route", "type": "tag"},
+			{"name": "allow_guest", "type": "tag"},
 			{"name": "meta_description", "weight": 1},
 			{"name": "meta_keywords", "weight": 3},
 			{"name": "modified", "sortable": True},
 		]
 		super().__init__("wiki_idx", "wiki_search_doc", schema)
 
-	def search(self, query, space=None, **kwargs):
+	def search(self, query, space=None, guest=False, **kwargs):
 		if query and space:
 			query = rf"{query} @route:{{{space}\/*}}"
+		if query and guest:
+			# filtered in the index, before results are scored and summarized
+			query = f"{query} @allow_guest:{{1}}"
 		return super().search(query, **kwargs)
 
 	def build_index(self):
-		self.drop_index()
-		self.create_index()
 		records = self.get_records()
-		total = len(records)
-		for i, doc in enumerate(records):
-			self.index_doc(doc)
-			if not hasattr(frappe.local, "request"):
-				update_progress_bar("Indexing Wiki Pages", i, total)
-		if not hasattr(frappe.local, "request"):
-			print()
+		return self.rebuild_index((self.get_document(doc) for doc in records), total=len(records))
+
+	def update_documents(self, names):
+		"""
+		Sync the documents of the given Wiki Pages with the database, pages that
+		are missing or unpublished are removed. Returns False if there is no index.
+		"""
+		return self.sync_documents(*self.get_changes(names))
+
+	def get_pending_changes(self):
+		"""Pages waiting in the queue of the indexer, they may have been synced to the previous version"""
+		from wiki.wiki.doctype.wiki_page.search import get_queued_pages
+
+		return self.get_changes(get_queued_pages())
+
+	def get_changes(self, names):
+		"""Documents of the given Wiki Pages and ids of the ones that are missing or unpublished"""
+		if not names:
+			return (), ()
+
+		records = self.get_records(names)
+		removed = set(names) - {doc.name for doc in records}
+		return [self.get_document(doc) for doc in records], [f"Wiki Page:{name}" for name in removed]
+
+	def reconcile(self):
+		"""
+		Re-index pages whose document is missing or older than the page and
+		remove documents of pages that are no longer published
+		"""
+		indexed = dict(self.scan_documents("modified"))
+		pages = {
+			f"Wiki Page:{page.name}": cstr(page.modified)
+			for page in frappe.get_all("Wiki Page", fields=["name", "modified"], filters={"published": 1})
+		}
+
+		stale = [id for id, modified in pages.items() if indexed.get(id) != modified]
+		removed = [id for id in indexed if id not in pages]
+		if stale or removed:
+			self.update_documents([id.split(":", 1)[1] for id in stale + removed])
+
+		return {"updated": len(stale), "removed": len(removed)}
 
 	def index_doc(self, doc):
+		self.add_document(*self.get_document(doc))
+
+	def get_document(self, doc):
 		id = f"Wiki Page:{doc.name}"
 		fields = {
 			"title": doc.title,
@@ -52,13 +89,14 @@ class WikiSearch(Search):
 			"meta_description": doc.meta_description or "",
 			"meta_keywords": doc.meta_keywords or "",
 			"modified": doc.modified,
+			"allow_guest": cstr(cint(doc.allow_guest)),
 		}
 		payload = {
 			"route": doc.route,
 			"published": doc.published,
 			"allow_guest": doc.allow_guest,
 		}
-		self.add_document(id, fields, payload=payload)
+		return id, fields, payload
 
 	def remove_doc(self, doc):
 		if doc.doctype == "Wiki Page":
@@ -71,7 +109,11 @@ class WikiSearch(Search):
 		query = query.strip()
 		return query
 
-	def get_records(self):
+	def get_records(self, names=None):
+		filters = {"published": 1}
+		if names is not None:
+			filters["name"] = ("in", list(names))
+
 		return frappe.get_all(
 			"Wiki Page",
 			fields=[
@@ -85,5 +127,5 @@ class WikiSearch(Search):
 				"published",
 				"allow_guest",
 			],
-			filters={"published": 1},
+			filters=filters,
 		)